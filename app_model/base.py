@@ -1,17 +1,170 @@
+import logging
+
+from helpers import tracing
+from helpers.cancel import Cancelled
+from helpers.tracing import span
+
+log = logging.getLogger(__name__)
+
+
+def payload_value(payload, *keys):
+    """Return the stripped input string from a raw string or a UI dict."""
+    if isinstance(payload, dict):
+        for key in keys:
+            value = payload.get(key)
+            if value:
+                return str(value).strip()
+        return ""
+    return (payload or "").strip()
+
+
+# Stages reported by load_staged(), in order
+LOAD_STAGES = ("resolve", "weights", "device", "warmup")
+STAGE_LABELS = {
+    "resolve": "resolving files",
+    "weights": "reading weights",
+    "device": "moving to device",
+    "warmup": "warming up",
+}
+
+
 class BaseModelAdapter:
     model_name = ""
     category = ""
     description = ""
+    max_batch_size = 8  # upper bound for one run_batch() forward pass
+    timeout_s = 120     # wall-clock limit for one run(); enforced through the cancel token
+    input_kind = "text"  # "text" or "image"; tells the result cache what to hash
+    cacheable = True     # False for non-deterministic adapters
+    warmup_runs = 1      # synthetic run()s after load, so the first real one isn't the slow one
 
     def __init__(self):
         self._pipe = None  # common convention
+        self._load_hooks = None  # (progress, cancel) while load_staged() runs
+
+    def configure(self, **options):
+        """Override class-level settings on this instance (e.g. from app_config.json)."""
+        for key, value in options.items():
+            # Only public settings the adapter class declares; unknown keys are ignored
+            if not key.startswith("_") and hasattr(type(self), key):
+                setattr(self, key, value)
+        return self
 
     def load(self):
         raise NotImplementedError
 
-    def run(self, payload):
+    def run(self, payload, cancel=None):
         raise NotImplementedError
 
+    def load_staged(self, progress=None, cancel=None, warmup=False):
+        """load() (+ warmup() if asked) with stage callbacks; progress(stage, index, total).
+
+        A triggered cancel token aborts at the next stage boundary and unloads.
+        """
+        self._load_hooks = (progress, cancel)
+        try:
+            self.load()
+            if warmup:
+                self._stage("warmup")
+                self.warmup()
+        except BaseException:
+            self.unload()
+            raise
+        finally:
+            self._load_hooks = None
+
+    def _stage(self, stage):
+        # Adapters call this between the steps of load()
+        progress, cancel = self._load_hooks or (None, None)
+        if cancel is not None:
+            cancel.check()
+        if progress is not None:
+            progress(stage, LOAD_STAGES.index(stage), len(LOAD_STAGES))
+
+    def warmup(self):
+        """Run synthetic input through the freshly loaded model (lazy allocations, kernel selection).
+
+        Not recorded in the latency histograms. A failing warm-up is logged; the
+        model stays loaded.
+        """
+        if not self.warmup_runs:
+            return
+        _, cancel = self._load_hooks or (None, None)
+        try:
+            with tracing.suppressed():
+                for _ in range(self.warmup_runs):
+                    if not self._warmup_run(cancel):
+                        return
+        except Cancelled:
+            raise
+        except Exception as ex:
+            log.warning("%s: warm-up run failed (%s)", self.category, ex)
+
+    def _warmup_run(self, cancel):
+        """One synthetic call; False if the adapter has no warm-up input."""
+        payload = self._warmup_payload()
+        if payload is None:
+            return False
+        self.run(payload, cancel=cancel)
+        return True
+
+    def _warmup_payload(self):
+        # Subclasses return a representative input
+        return None
+
+    def _staged_pipeline(self, inputs, **postprocess_params):
+        """Run one input through self._pipe stage by stage, so each stage gets its own span.
+
+        Same steps as pipe(inputs) for a single input; batched calls go through the
+        pipeline directly, since it pads and collates the batch itself.
+        """
+        with span("preprocess"):
+            model_inputs = self._pipe.preprocess(inputs)
+        with span("forward"):
+            model_outputs = self._pipe.forward(model_inputs)
+        with span("postprocess"):
+            return self._pipe.postprocess(model_outputs, **postprocess_params)
+
+    def cache_params(self):
+        # Anything besides the input that changes the output belongs in the cache key
+        return {}
+
+    def run_batch(self, payloads, cancel=None):
+        # Fallback for adapters without a batched forward pass.
+        # Subclasses override this to push the whole list through the model at once.
+        return [self.run(p, cancel=cancel) for p in payloads]
+
+    def is_loaded(self):
+        return getattr(self, "_pipe", None) is not None or getattr(self, "_model", None) is not None
+
+    def unload(self):
+        # Drop every model reference; the caller runs gc afterwards
+        for attr in ("_pipe", "_model", "_processor"):
+            if hasattr(self, attr):
+                setattr(self, attr, None)
+
+    def torch_modules(self):
+        """Yield the torch modules behind this adapter (pipeline model, BLIP model, SD components)."""
+        seen = set()
+        for obj in (getattr(self, "_pipe", None), getattr(self, "_model", None)):
+            if obj is None:
+                continue
+            candidates = [obj, getattr(obj, "model", None)]
+            components = getattr(obj, "components", None)
+            if isinstance(components, dict):
+                candidates += list(components.values())
+            for mod in candidates:
+                if hasattr(mod, "parameters") and hasattr(mod, "buffers") and id(mod) not in seen:
+                    seen.add(id(mod))
+                    yield mod
+
+    def param_bytes(self):
+        total = 0
+        for mod in self.torch_modules():
+            for t in list(mod.parameters()) + list(mod.buffers()):
+                total += t.numel() * t.element_size()
+        return total
+
     def info(self):
         # Return a dict so Infoframe can format it nicely
         return {
@@ -0,0 +1,214 @@
+# app_model/compiled.py
+import hashlib
+import json
+import logging
+import os
+
+BACKENDS = ("eager", "torchscript", "compile")
+COMPILED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "compiled"))
+
+log = logging.getLogger(__name__)
+
+
+def _bucket(n, buckets):
+    """Smallest bucket >= n, or None if n is larger than all of them."""
+    for b in buckets:
+        if n <= b:
+            return b
+    return None
+
+
+class CompiledBackendMixin:
+    """Run a classifier's forward pass through a TorchScript trace or torch.compile graph.
+
+    Inputs are padded up to a few fixed (batch, sequence) buckets so each graph
+    sees a static shape. TorchScript traces go to .cache/compiled, one file per
+    model/precision/library version, so later startups only load them. Anything
+    that fails (trace, load, or a call) falls back to the eager model.
+
+    Subclasses list their model inputs in `compiled_inputs`, the bucket sizes, and
+    implement _example_inputs(); load() calls _compile_backend(model) last.
+    """
+
+    backend = "eager"          # eager | torchscript | compile
+    batch_buckets = (1, 8, 32)
+    seq_buckets = ()           # empty: only the batch dimension varies
+    compiled_inputs = ()       # model forward() argument names, in order
+
+    def _example_inputs(self, batch, seq):
+        raise NotImplementedError
+
+    def _pad_value(self, name):
+        return 0
+
+    # ---------------- Building ---------------- #
+    def _compile_backend(self, model):
+        """Route model.forward through the compiled graph; returns what is active."""
+        self._graph = None
+        self._eager_forward = None
+        self.active_backend = "eager"
+        if self.backend == "eager":
+            return self.active_backend
+        try:
+            if self.backend == "torchscript":
+                self._graph = self._load_or_trace(model)
+            elif self.backend == "compile":
+                self._graph = self._torch_compile(model)
+            else:
+                raise ValueError(f"unknown backend {self.backend!r}")
+        except Exception as ex:
+            log.warning("%s: %s backend unavailable, using eager (%s)", self.category, self.backend, ex)
+            self.active_backend = f"eager (fallback: {type(ex).__name__})"
+            return self.active_backend
+
+        self._eager_forward = model.forward
+        model.forward = self._compiled_forward  # what the pipeline ends up calling
+        self.active_backend = self.backend
+        return self.active_backend
+
+    def _shapes(self):
+        seqs = self.seq_buckets or (None,)
+        return [(b, s) for b in self.batch_buckets for s in seqs]
+
+    @staticmethod
+    def _method(batch, seq):
+        return f"b{batch}" if seq is None else f"b{batch}_s{seq}"
+
+    def _artifact_path(self, model):
+        import torch
+        import transformers
+
+        key = json.dumps({
+            "model": self.model_name,
+            "revision": getattr(model.config, "_commit_hash", None),
+            "precision": getattr(self, "precision", "fp32"),
+            "shapes": self._shapes(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+        }, sort_keys=True)
+        slug = self.category.lower().replace(" ", "-")
+        return os.path.join(COMPILED_DIR, f"{slug}-{hashlib.sha1(key.encode()).hexdigest()[:16]}.pt")
+
+    def _load_or_trace(self, model):
+        import torch
+
+        path = self._artifact_path(model)
+        if os.path.exists(path):
+            traced = torch.jit.load(path, map_location="cpu")
+            _share_parameters(traced, model)  # don't keep a second copy of the weights
+            return traced
+
+        # One module, one traced method per bucket: the weights are stored once
+        methods = {self._method(b, s): self._example_inputs(b, s) for b, s in self._shapes()}
+        wrapper = _logits_module(model, self.compiled_inputs, methods)
+        with torch.no_grad():
+            traced = torch.jit.trace_module(wrapper, methods, check_trace=False)
+        os.makedirs(COMPILED_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            torch.jit.save(traced, tmp)
+            os.replace(tmp, path)
+        except OSError as ex:
+            log.warning("%s: could not cache the trace (%s)", self.category, ex)
+        return traced
+
+    def _torch_compile(self, model):
+        import torch
+
+        # Inductor's FX graph cache makes later startups skip most of the compile work
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(COMPILED_DIR, "inductor"))
+        import torch._inductor.config as inductor_config
+        inductor_config.fx_graph_cache = True
+        torch._dynamo.config.cache_size_limit = max(torch._dynamo.config.cache_size_limit, len(self._shapes()) + 2)
+
+        compiled = torch.compile(_logits_module(model, self.compiled_inputs), dynamic=False)
+        with torch.no_grad():
+            compiled(*self._example_inputs(*self._shapes()[0]))  # compile the smallest bucket now
+        return compiled
+
+    # ---------------- Running ---------------- #
+    def _compiled_forward(self, *args, **inputs):
+        from transformers.modeling_outputs import SequenceClassifierOutput
+
+        graph = self._graph
+        tensors = [inputs.get(name) for name in self.compiled_inputs]
+        if graph is None or args or any(t is None for t in tensors) or set(inputs) - set(self.compiled_inputs):
+            return self._eager_forward(*args, **inputs)
+
+        batch = tensors[0].shape[0]
+        seq = tensors[0].shape[1] if self.seq_buckets else None
+        b = _bucket(batch, self.batch_buckets)
+        s = _bucket(seq, self.seq_buckets) if seq is not None else None
+        if b is None or (seq is not None and s is None):
+            return self._eager_forward(**inputs)  # bigger than any bucket
+
+        padded = [self._pad(t, name, b, s) for t, name in zip(tensors, self.compiled_inputs)]
+        try:
+            fn = getattr(graph, self._method(b, s)) if self.active_backend == "torchscript" else graph
+            logits = fn(*padded)[:batch]
+        except Exception as ex:
+            log.warning("%s: compiled call failed, switching to eager (%s)", self.category, ex)
+            self._graph = None
+            self.active_backend = f"eager (fallback: {type(ex).__name__})"
+            return self._eager_forward(**inputs)
+        return SequenceClassifierOutput(logits=logits)
+
+    def _pad(self, tensor, name, batch, seq):
+        import torch.nn.functional as F
+
+        # F.pad takes (left, right) pairs starting from the last dimension
+        pad = [0] * (2 * tensor.dim())
+        pad[2 * (tensor.dim() - 1) + 1] = batch - tensor.shape[0]
+        if seq is not None:
+            pad[2 * (tensor.dim() - 2) + 1] = seq - tensor.shape[1]
+        if not any(pad):
+            return tensor
+        return F.pad(tensor, pad, value=self._pad_value(name))
+
+    # ---------------- Lifecycle ---------------- #
+    def unload(self):
+        super().unload()
+        self._graph = None
+        self._eager_forward = None
+
+    def info(self):
+        data = super().info()
+        active = getattr(self, "active_backend", None)
+        if active and self.is_loaded():
+            data["Backend"] = active if active.startswith("eager") else f"{active} ({len(self._shapes())} shapes)"
+        return data
+
+
+def _logits_module(model, names, methods=()):
+    """Wrapper taking positional tensors and returning logits only (plain tensor I/O for the graph).
+
+    `methods` adds aliases of forward(), so trace_module() can trace one per bucket.
+    """
+    import torch
+
+    class Logits(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+            self.names = list(names)
+
+        def forward(self, *tensors):
+            # The class forward, not model.forward, which may already point at the compiled path
+            out = type(self.model).forward(self.model, **dict(zip(self.names, tensors)), return_dict=False)
+            return out[0]
+
+    for name in methods:
+        setattr(Logits, name, Logits.forward)
+    return Logits().eval()
+
+
+def _share_parameters(traced, model):
+    import torch
+
+    eager = dict(model.named_parameters())
+    with torch.no_grad():
+        for name, param in traced.named_parameters():
+            src = eager.get(name[len("model."):])
+            if src is not None and src.shape == param.shape and src.dtype == param.dtype:
+                param.set_(src)
+
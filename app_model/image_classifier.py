@@ -1,26 +1,161 @@
-from transformers import pipeline
-from PIL import Image
 from helpers.decorators import log_action, timeit
-from app_model.base import BaseModelAdapter
+from helpers.cancel import check
+from helpers.tracing import span
+from helpers.images import load_image, warmup_image
+from app_model.base import BaseModelAdapter, payload_value
+from app_model.quantization import QuantizationMixin
+from app_model.compiled import CompiledBackendMixin
 
-class ImageClassifierAdapter(BaseModelAdapter):
+class ImageClassifierAdapter(CompiledBackendMixin, QuantizationMixin, BaseModelAdapter):
     model_name = "google/vit-base-patch16-224"
     category = "Image Classification"
     description = "Classifies an image with ViT."
+    max_batch_size = 16
+    timeout_s = 60
+    input_kind = "image"
+    decode_size = (224, 224)  # ViT input; larger photos are decoded at a reduced scale
+    # torchscript / compile backends: batches padded up to these sizes
+    compiled_inputs = ("pixel_values",)
+    batch_buckets = (1, 4, 16)
+    top_k = 1                 # labels per result
+    # single: one downscaled view; tiles: a grid over the image; multicrop: corners + centre.
+    # Region modes add the whole view, classify everything in one batch and average.
+    regions = "single"
+    region_decode = (1344, 1344)  # region modes decode at least this large (once per image)
+    tile_size = 448           # target tile side in decoded pixels
+    max_grid = 3              # at most max_grid x max_grid tiles
+    crop_fraction = 0.6       # multicrop: crop side / shorter image side
 
     def load(self):
-        self._pipe = pipeline("image-classification", model=self.model_name)
+        # heavy; imported on first load only
+        from transformers import AutoImageProcessor, AutoModelForImageClassification, pipeline
+
+        self._stage("resolve")
+        processor = AutoImageProcessor.from_pretrained(self.model_name)
+        self._stage("weights")
+        model = self._quantize(AutoModelForImageClassification.from_pretrained(self.model_name))
+        self._stage("device")
+        self._pipe = pipeline("image-classification", model=model, image_processor=processor)
+        self._compile_backend(model)
+
+    def _warmup_payload(self):
+        return warmup_image(self.decode_size)
+
+    def _example_inputs(self, batch, seq):
+        import torch
+        config = self._pipe.model.config
+        size = config.image_size  # what the image processor resizes to
+        return (torch.zeros(batch, config.num_channels, size, size),)
 
     @log_action
     @timeit
-    def run(self, payload):
+    def run(self, payload, cancel=None):
         # payload may be a raw path string or a UI dict
-        if isinstance(payload, dict):
-            path = (payload.get("image_path") or payload.get("prompt") or "").strip()
-        else:
-            path = (payload or "").strip()
+        path = payload_value(payload, "image_path", "prompt")
         if not path:
             return {"result":"Choose an image file first."}
-        img = Image.open(path).convert("RGB")
-        pred = self._pipe(img)[0]
-        return {"result": f"{pred['label']} ({pred['score']:.2f})", "image_path": path}
+        if self.regions != "single":
+            return self._classify_regions(path, cancel)
+        with span("decode"):
+            img = load_image(path, self.decode_size)
+        check(cancel)
+        preds = self._staged_pipeline(img, top_k=self.top_k)
+        check(cancel)
+        return self._result(path, preds)
+
+    @log_action
+    @timeit
+    def run_batch(self, payloads, cancel=None):
+        paths = [payload_value(p, "image_path", "prompt") for p in payloads]
+        results = [{"result": "Choose an image file first."} for _ in paths]
+
+        todo = [i for i, p in enumerate(paths) if p]
+        if todo and self.regions != "single":
+            # Each image is already a batch of regions
+            for i in todo:
+                results[i] = self._classify_regions(paths[i], cancel)
+        elif todo:
+            with span("decode"):
+                imgs = [load_image(paths[i], self.decode_size) for i in todo]
+            # A list input returns one list of predictions per image
+            check(cancel)
+            with span("forward"):  # preprocess + forward + top-k for the whole batch
+                preds = self._pipe(imgs, batch_size=len(imgs), top_k=self.top_k)
+            check(cancel)
+            for i, pred in zip(todo, preds):
+                results[i] = self._result(paths[i], pred)
+        return results
+
+    def _result(self, path, preds):
+        # top_k 1 keeps the original "label (score)" output
+        res = {"result": _format(preds), "image_path": path}
+        if self.top_k > 1:
+            res["labels"] = preds
+        return res
+
+    # ---------------- Regions ---------------- #
+    def _classify_regions(self, path, cancel=None):
+        """Classify tiles / crops of one decode in a single batch; returns averaged and per-region labels."""
+        import torch
+
+        with span("decode"):
+            img = load_image(path, self.region_decode)
+        boxes = [(0, 0, img.width, img.height)] + self._region_boxes(img.width, img.height)
+        check(cancel)
+
+        model = self._pipe.model
+        with span("preprocess"):
+            # The processor resizes every crop to the model's input size
+            pixels = self._pipe.image_processor(images=[img.crop(b) for b in boxes], return_tensors="pt")["pixel_values"]
+        probs = []
+        with span("forward"), torch.no_grad():
+            for start in range(0, len(boxes), self.max_batch_size):
+                check(cancel)
+                logits = model(pixel_values=pixels[start:start + self.max_batch_size].to(model.device)).logits
+                probs.append(logits.float().softmax(-1).cpu())
+        check(cancel)
+
+        with span("postprocess"):
+            probs = torch.cat(probs)
+            overall = self._top(probs.mean(dim=0))
+            regions = [{"box": list(box), "labels": self._top(p)} for box, p in zip(boxes, probs)]
+
+        name = "tile" if self.regions == "tiles" else "crop"
+        lines = [f"{_format(overall)} over {len(boxes)} regions", f"  whole image: {_format(regions[0]['labels'])}"]
+        lines += [f"  {name} {n} {tuple(r['box'])}: {_format(r['labels'])}" for n, r in enumerate(regions[1:], 1)]
+        return {"result": "\n".join(lines), "image_path": path, "labels": overall, "regions": regions}
+
+    def _region_boxes(self, width, height):
+        """(left, top, right, bottom) boxes in decoded-image pixels for the configured mode."""
+        if self.regions == "tiles":
+            cols = max(1, min(self.max_grid, round(width / self.tile_size)))
+            rows = max(1, min(self.max_grid, round(height / self.tile_size)))
+            if cols == rows == 1:
+                return []  # the whole view already is the only tile
+            xs = [round(width * c / cols) for c in range(cols + 1)]
+            ys = [round(height * r / rows) for r in range(rows + 1)]
+            return [(xs[c], ys[r], xs[c + 1], ys[r + 1]) for r in range(rows) for c in range(cols)]
+        if self.regions == "multicrop":
+            side = max(1, round(min(width, height) * self.crop_fraction))
+            left, top = (width - side) // 2, (height - side) // 2
+            corners = [(0, 0), (width - side, 0), (0, height - side), (width - side, height - side), (left, top)]
+            return [(x, y, x + side, y + side) for x, y in corners]
+        raise ValueError(f"Unknown regions mode {self.regions!r}; expected single, tiles or multicrop")
+
+    def _top(self, probs):
+        labels = self._pipe.model.config.id2label
+        scores, ids = probs.topk(min(self.top_k, len(probs)))
+        return [{"label": labels[int(i)], "score": round(float(s), 4)} for s, i in zip(scores, ids)]
+
+    def cache_params(self):
+        params = super().cache_params()
+        if self.top_k != 1:
+            params["top_k"] = self.top_k
+        if self.regions != "single":
+            params.update(regions=self.regions, region_decode=list(self.region_decode), tile_size=self.tile_size,
+                          max_grid=self.max_grid, crop_fraction=self.crop_fraction)
+        return params
+
+
+def _format(preds):
+    return ", ".join(f"{p['label']} ({p['score']:.2f})" for p in preds)
@@ -1,37 +1,152 @@
-from transformers import BlipProcessor, BlipForConditionalGeneration
-from PIL import Image
-import torch
+import time
+
 from helpers.decorators import log_action, timeit
-from app_model.base import BaseModelAdapter
+from helpers.cancel import check
+from helpers.tracing import span
+from helpers.images import load_image, warmup_image
+from app_model.base import BaseModelAdapter, payload_value
+from app_model.quantization import QuantizationMixin
+
+DECODINGS = ("greedy", "beam", "sample")
+
+def _stopping_criteria(cancel):
+    """StoppingCriteriaList that ends generate() as soon as `cancel` trips."""
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class _CancelCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), cancel.cancelled, dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([_CancelCriteria()])
+
 
-class ImageToTextAdapter(BaseModelAdapter):
+class ImageToTextAdapter(QuantizationMixin, BaseModelAdapter):
     model_name  = "Salesforce/blip-image-captioning-large"
     category    = "Image-to-Text"
     description = "Generates a descriptive caption for an image (BLIP-large)."
+    max_batch_size = 8
+    timeout_s = 180
+    input_kind = "image"
+    decode_size = (384, 384)  # BLIP-large input
+    # generate() settings; all of them go into the result cache key
+    decoding = "greedy"       # greedy | beam | sample
+    num_beams = 4             # beam
+    temperature = 1.0         # sample
+    top_k = 50                # sample
+    top_p = 0.95              # sample
+    min_new_tokens = 0
+    max_new_tokens = 40
+    use_cache = True          # reuse past keys/values between decoding steps
+
+    def configure(self, **options):
+        super().configure(**options)
+        # Sampled captions change from run to run; don't serve them from the cache
+        self.cacheable = self.decoding != "sample"
+        return self
 
     def load(self):
+        # heavy; imported on first load only
+        import torch
+        from transformers import BlipProcessor, BlipForConditionalGeneration
+
         device = "cuda" if torch.cuda.is_available() else "cpu"
         self._device = device
 
+        self._stage("resolve")
         self._processor = BlipProcessor.from_pretrained(self.model_name)
-        self._model = BlipForConditionalGeneration.from_pretrained(self.model_name).to(device)
+        self._stage("weights")
+        model = BlipForConditionalGeneration.from_pretrained(self.model_name)
+        self._stage("device")
+        self._model = self._quantize(model.to(device), device)
+
+    def _warmup_payload(self):
+        return warmup_image(self.decode_size)
 
     @log_action
     @timeit
-    def run(self, payload):
+    def run(self, payload, cancel=None):
         # payload may be a raw path string or a UI dict
-        if isinstance(payload, dict):
-            path = (payload.get("image_path") or payload.get("prompt") or "").strip()
-        else:
-            path = (payload or "").strip()
+        path = payload_value(payload, "image_path", "prompt")
 
         if not path:
             return {"result": "Choose an image file first."}
 
-        image = Image.open(path).convert("RGB")
-        inputs = self._processor(images=image, return_tensors="pt").to(self._device)
+        with span("decode"):
+            image = load_image(path, self.decode_size)
+        caption, stats = self._caption([image], cancel)
+        return {"result": f"Caption: {caption[0]}", "image_path": path, "_gen": stats[0]}
+
+    @log_action
+    @timeit
+    def run_batch(self, payloads, cancel=None):
+        paths = [payload_value(p, "image_path", "prompt") for p in payloads]
+        results = [{"result": "Choose an image file first."} for _ in paths]
+
+        todo = [i for i, p in enumerate(paths) if p]
+        if todo:
+            # Every image is resized to the same input size, so they stack into one batch
+            with span("decode"):
+                images = [load_image(paths[i], self.decode_size) for i in todo]
+            captions, stats = self._caption(images, cancel)
+            for i, caption, gen in zip(todo, captions, stats):
+                results[i] = {"result": f"Caption: {caption}", "image_path": paths[i], "_gen": gen}
+        return results
+
+    def _caption(self, images, cancel):
+        """One generate() call for all images; returns captions and per-image token stats."""
+        with span("preprocess"):
+            inputs = self._processor(images=images, return_tensors="pt").to(self._device)
+
+        t0 = time.perf_counter()
+        with span("generate"):
+            out = self._model.generate(**inputs, **self.generate_kwargs(), **self._generate_hooks(cancel))
+        generate_s = time.perf_counter() - t0
+        check(cancel)  # generation stopped early because of the token
+
+        with span("postprocess"):
+            captions = [c.strip() for c in self._processor.batch_decode(out, skip_special_tokens=True)]
+
+        # The first position is the decoder start token, not a generated one
+        tokens = (out[:, 1:] != self._processor.tokenizer.pad_token_id).sum(dim=1).tolist()
+        total = sum(tokens)
+        stats = [{
+            "tokens": n,
+            "tokens_per_s": round(total / generate_s, 1) if generate_s else None,
+            "ms_per_image": round(generate_s * 1000 / len(images), 1),
+            "batch": len(images),
+        } for n in tokens]
+        return captions, stats
+
+    def generate_kwargs(self):
+        """generate() arguments for the configured decoding strategy and limits."""
+        kwargs = {"max_new_tokens": self.max_new_tokens, "min_new_tokens": self.min_new_tokens,
+                  "use_cache": self.use_cache}
+        if self.decoding == "greedy":
+            kwargs.update(num_beams=1, do_sample=False)
+        elif self.decoding == "beam":
+            kwargs.update(num_beams=self.num_beams, do_sample=False, early_stopping=True)
+        elif self.decoding == "sample":
+            kwargs.update(num_beams=1, do_sample=True, temperature=self.temperature,
+                          top_k=self.top_k, top_p=self.top_p)
+        else:
+            raise ValueError(f"Unknown decoding {self.decoding!r}; expected one of {', '.join(DECODINGS)}")
+        return kwargs
+
+    def cache_params(self):
+        params = {**super().cache_params(), **self.generate_kwargs(), "decoding": self.decoding}
+        params.pop("use_cache")  # same captions either way
+        return params
 
-        out = self._model.generate(**inputs, max_new_tokens=40)
-        caption = self._processor.decode(out[0], skip_special_tokens=True).strip()
+    def _generate_hooks(self, cancel):
+        if cancel is None:
+            return {}
+        return {"stopping_criteria": _stopping_criteria(cancel)}
 
-        return {"result": f"Caption: {caption}", "image_path": path}
+    def info(self):
+        data = super().info()
+        data["Decoding"] = {"greedy": "greedy", "beam": f"beam search ({self.num_beams} beams)",
+                            "sample": f"sampling (T={self.temperature}, top-k {self.top_k}, top-p {self.top_p})",
+                            }.get(self.decoding, self.decoding)
+        data["Length"] = f"{self.min_new_tokens}-{self.max_new_tokens} tokens"
+        return data
@@ -0,0 +1,59 @@
+# app_model/quantization.py
+
+PRECISIONS = ("fp32", "int8")
+
+
+class QuantizationMixin:
+    """Optional dynamic int8 quantization of a transformer adapter's Linear layers.
+
+    With precision "int8" the Linear weights are stored as int8 and activations are
+    quantized on the fly (torch.ao dynamic quantization, CPU only). Mix in before
+    BaseModelAdapter and pass the freshly loaded model through _quantize().
+    """
+
+    precision = "fp32"  # fp32 | int8
+
+    def _quantize(self, model, device="cpu"):
+        if self.precision != "int8" or device != "cpu":
+            return model
+        import torch
+        from torch.ao.quantization import quantize_dynamic
+
+        engines = torch.backends.quantized.supported_engines
+        for engine in ("x86", "fbgemm", "qnnpack"):
+            if engine in engines:
+                torch.backends.quantized.engine = engine
+                break
+        # In place: no second fp32 copy of the model while converting
+        return quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    def cache_params(self):
+        params = super().cache_params()
+        if self.precision != "fp32":
+            # int8 outputs can differ slightly; fp32 keeps its existing cache keys
+            params["precision"] = self.precision
+        return params
+
+    def param_bytes(self):
+        # Quantized Linear weights are packed outside parameters(); state_dict() sees them
+        seen = set()  # tied weights appear under several keys
+        return sum(_tensor_bytes(v, seen) for mod in self.torch_modules() for v in mod.state_dict().values())
+
+    def info(self):
+        data = super().info()
+        data["Precision"] = self.precision
+        if self.is_loaded():
+            data["Weights"] = f"{self.param_bytes() / (1024 * 1024):.0f} MB"
+        return data
+
+
+def _tensor_bytes(value, seen):
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v, seen) for v in value)
+    if not hasattr(value, "numel") or not hasattr(value, "element_size"):
+        return 0
+    ptr = value.data_ptr()
+    if ptr in seen:
+        return 0
+    seen.add(ptr)
+    return value.numel() * value.element_size()
@@ -0,0 +1,110 @@
+# app_model/registry.py
+import importlib
+import threading
+import time
+from collections.abc import Mapping
+
+
+class AdapterSpec:
+    """Lightweight registry entry: knows where an adapter lives, builds it on first use."""
+
+    def __init__(self, module, class_name, heavy=()):
+        self.module = module
+        self.class_name = class_name
+        self.heavy = heavy  # "module" or "module:attr" names load() will need
+
+    def create(self, options=None):
+        cls = getattr(importlib.import_module(self.module), self.class_name)
+        return cls().configure(**(options or {}))
+
+
+# Adapter modules only import torch/transformers/diffusers inside load()
+MODEL_SPECS = {
+    "Text Classification": AdapterSpec(
+        "app_model.text_sentiment", "TextSentimentAdapter",
+        heavy=("torch", "transformers:pipeline")),
+    "Image Classification": AdapterSpec(
+        "app_model.image_classifier", "ImageClassifierAdapter",
+        heavy=("PIL.Image", "torch", "transformers:pipeline")),
+    "Image-to-Text": AdapterSpec(
+        "app_model.image_to_text", "ImageToTextAdapter",
+        heavy=("PIL.Image", "torch", "transformers:BlipForConditionalGeneration")),
+    "Text-to-Image": AdapterSpec(
+        "app_model.text_to_image", "TextToImageAdapter",
+        heavy=("torch", "diffusers:StableDiffusionPipeline")),
+}
+
+
+class ModelRegistry(Mapping):
+    """name -> adapter mapping that instantiates adapters lazily."""
+
+    def __init__(self, specs, options=None):
+        self._specs = dict(specs)
+        self._options = options or {}  # name -> adapter settings
+        self._adapters = {}
+        self._lock = threading.Lock()
+        self._prefetched = set()
+        self.import_times = {}  # heavy module -> seconds spent importing it
+
+    def __getitem__(self, name):
+        with self._lock:
+            adapter = self._adapters.get(name)
+            if adapter is None:
+                adapter = self._adapters[name] = self._create(name)
+            return adapter
+
+    def _create(self, name):
+        return self._specs[name].create(self._options.get(name))
+
+    def __iter__(self):
+        return iter(self._specs)
+
+    def __len__(self):
+        return len(self._specs)
+
+    def created(self):
+        """Adapters that have been instantiated so far."""
+        with self._lock:
+            return dict(self._adapters)
+
+    def prefetch(self, name):
+        """Start importing the heavy libraries for `name` on a background thread."""
+        with self._lock:
+            if name in self._prefetched or name not in self._specs:
+                return None
+            self._prefetched.add(name)
+        t = threading.Thread(target=self._import_heavy, args=(self._specs[name],), daemon=True)
+        t.start()
+        return t
+
+    def close(self):
+        """Release what the registry owns beyond the adapters (nothing in-process)."""
+
+    def _import_heavy(self, spec):
+        for target in spec.heavy:
+            mod_name, _, attr = target.partition(":")
+            t0 = time.perf_counter()
+            try:
+                mod = importlib.import_module(mod_name)
+                if attr:
+                    getattr(mod, attr)  # resolves transformers/diffusers lazy modules
+            except Exception:
+                continue  # load() will surface the real error
+            self.import_times.setdefault(target, time.perf_counter() - t0)
+
+
+def build_models(options=None, process_mode="inline"):
+    """Model registry shared by the Tk app and the headless runners.
+
+    `options` is the "model_options" section of app_config.json. With
+    process_mode "worker" the models run in a separate process (app_model/worker.py).
+    """
+    if process_mode == "worker":
+        from app_model.worker import WorkerRegistry
+        return WorkerRegistry(MODEL_SPECS, options)
+    return ModelRegistry(MODEL_SPECS, options)
+
+
+def model_slug(name):
+    # "Image-to-Text" -> "image-to-text", handy on the command line
+    return name.lower().replace(" ", "-")
@@ -0,0 +1,150 @@
+# app_model/residency.py
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from helpers.memory import current_rss, total_memory, release_memory
+
+MB = 1024 * 1024
+
+
+class ResidencyManager:
+    """Keeps loaded models within a memory budget, evicting the least recently used.
+
+    Each adapter's cost is the larger of the RSS growth measured around load()
+    and its parameter bytes. Models are reloaded transparently on next use.
+    """
+
+    def __init__(self, models, budget_mb=0):
+        self.models = models
+        # 0 = automatic: half of physical memory
+        self.budget = int(budget_mb * MB) if budget_mb else total_memory() // 2
+        self._lru = OrderedDict()   # name -> {"rss": bytes, "params": bytes, "cost": bytes}
+        self._known = {}            # last measured cost, kept across evictions
+        self._pins = {}             # name -> number of runs currently using it
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self.evicted = []           # names evicted by the most recent ensure_loaded()
+
+    # ---------------- Loading ---------------- #
+    def ensure_loaded(self, name, progress=None, cancel=None, warmup=False):
+        """Return a loaded adapter for `name`, loading (and evicting others) if needed.
+
+        warmup=True also runs the adapter's synthetic warm-up after a fresh load.
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            adapter = self.models[name]
+            with self._lock:
+                self.evicted = []
+                if adapter.is_loaded():
+                    self._touch(name)
+                    return adapter
+                # Make room up front when we already know roughly what it costs
+                self._enforce(extra=self._known.get(name, 0), keep=name)
+
+            rss0 = current_rss()
+            try:
+                adapter.load_staged(progress, cancel, warmup)
+            except BaseException:
+                release_memory()
+                raise
+            rss = max(current_rss() - rss0, 0)
+            params = adapter.param_bytes()
+
+            with self._lock:
+                entry = {"rss": rss, "params": params, "cost": max(rss, params), "loaded_at": time.time()}
+                self._lru[name] = entry
+                self._known[name] = entry["cost"]
+                self._touch(name)
+                self._enforce(keep=name)
+            return adapter
+
+    @contextmanager
+    def use(self, name):
+        """Pin `name` while it runs so it is never evicted mid-inference."""
+        with self._lock:
+            self._pins[name] = self._pins.get(name, 0) + 1
+        try:
+            yield self.ensure_loaded(name)
+        finally:
+            with self._lock:
+                self._pins[name] -= 1
+                self._touch(name)
+
+    def evict(self, name):
+        with self._lock:
+            if self._pins.get(name):
+                return False
+            self._lru.pop(name, None)
+            adapter = self.models.created().get(name)
+        if adapter is not None:
+            adapter.unload()
+        release_memory()
+        return True
+
+    def reconfigure(self, name, **options):
+        """Unload `name` and apply `options` to it, so it reloads with them on next use.
+
+        Returns False, changing nothing, while the model is running or loading:
+        settings that shape the weights must never disagree with the loaded ones.
+        """
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        if not load_lock.acquire(blocking=False):
+            return False  # a load is in progress
+        try:
+            with self._lock:
+                if self._pins.get(name):
+                    return False
+                adapter = self.models[name]
+                if adapter.is_loaded() and not self.evict(name):
+                    return False
+                # Under the load lock: nothing can load it again with the old settings
+                adapter.configure(**options)
+            return True
+        finally:
+            load_lock.release()
+
+    # ---------------- Accounting ---------------- #
+    def used(self):
+        with self._lock:
+            return sum(e["cost"] for e in self._lru.values())
+
+    def resident(self):
+        """(name, cost in bytes) from least to most recently used."""
+        with self._lock:
+            return [(name, e["cost"]) for name, e in self._lru.items()]
+
+    def summary(self):
+        used, budget = self.used() / MB, self.budget / MB
+        names = ", ".join(f"{n} {c / MB:.0f} MB" for n, c in self.resident()) or "none"
+        return f"Resident: {names} ({used:.0f}/{budget:.0f} MB)"
+
+    def known_cost(self, name):
+        """Last measured cost of `name` in bytes (0 if it was never loaded)."""
+        with self._lock:
+            return self._known.get(name, 0)
+
+    def was_loaded(self, name):
+        """True if `name` has been loaded before (it may be evicted right now)."""
+        with self._lock:
+            return name in self._known
+
+    def _touch(self, name):
+        if name in self._lru:
+            self._lru.move_to_end(name)
+
+    def _enforce(self, extra=0, keep=None):
+        # Called with the lock held
+        if self.budget <= 0:
+            return
+        for name in list(self._lru):
+            if self.used() + extra <= self.budget:
+                break
+            if name == keep or self._pins.get(name):
+                continue
+            if self.evict(name):
+                self.evicted.append(name)
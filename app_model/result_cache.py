@@ -0,0 +1,238 @@
+# app_model/result_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app_model.base import payload_value
+
+_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "results"))
+_SKIP_KEYS = ("_ms", "_cached", "_gen")  # per-call timings
+
+DEFAULTS = {
+    "enabled": True,
+    "memory_items": 256,
+    "disk": False,      # persist results across restarts
+    "disk_mb": 256,
+}
+_FILE_HASHES = 1024  # remembered (path, mtime, size) -> digest entries
+
+
+class ResultCache:
+    """Content-addressed result cache shared by all adapters.
+
+    Keys hash the model name, the adapter's generation parameters and the input
+    (text bytes, or the bytes of the image file). Two tiers: an in-memory LRU and
+    an optional JSON-per-entry directory with size-based eviction.
+    """
+
+    def __init__(self, memory_items=256, disk=False, disk_mb=256, disk_dir=_CACHE_DIR, enabled=True):
+        self.enabled = enabled
+        self.memory_items = memory_items
+        self.disk_dir = disk_dir if disk else None
+        self.disk_budget = int(disk_mb * 1024 * 1024)
+
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_hashes = OrderedDict()  # (path, mtime, size) -> digest, so big files are hashed once
+        self._disk_index = OrderedDict()  # key -> size, oldest first
+        self._disk_bytes = 0
+        self.hits = self.misses = self.disk_hits = 0
+
+        if self.disk_dir:
+            self._scan_disk()
+
+    @classmethod
+    def from_config(cls, cfg):
+        opts = {**DEFAULTS, **(cfg.get("result_cache") or {})}
+        return cls(opts["memory_items"], opts["disk"], opts["disk_mb"], enabled=opts["enabled"])
+
+    # ---------------- Keys ---------------- #
+    def key(self, adapter, payload):
+        """Cache key for (adapter, payload), or None if the result must not be cached."""
+        if not self.enabled or not getattr(adapter, "cacheable", True):
+            return None
+        if adapter.input_kind == "image":
+            path = payload_value(payload, "image_path", "prompt")
+            if not path or not os.path.isfile(path):
+                return None
+            digest = self._file_digest(path)
+        else:
+            text = payload_value(payload, "prompt", "text")
+            if not text:
+                return None
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+        params = json.dumps(adapter.cache_params(), sort_keys=True, default=str)
+        raw = f"{adapter.model_name}\0{params}\0{digest}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _file_digest(self, path):
+        st = os.stat(path)
+        ident = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._lock:
+            digest = self._file_hashes.get(ident)
+            if digest is not None:
+                self._file_hashes.move_to_end(ident)
+                return digest
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            # Small LRU: the server uploads every request to a fresh temp path
+            self._file_hashes[ident] = digest
+            while len(self._file_hashes) > _FILE_HASHES:
+                self._file_hashes.popitem(last=False)
+        return digest
+
+    # ---------------- Lookup ---------------- #
+    def get(self, key):
+        with self._lock:
+            value = self._mem.get(key)
+            if value is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return dict(value)
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        self._mem_put(key, value)
+        return dict(value)
+
+    def put(self, key, result):
+        if key is None or not isinstance(result, dict):
+            return
+        value = {k: v for k, v in result.items() if k not in _SKIP_KEYS}
+        self._mem_put(key, value)
+        self._disk_put(key, value)
+
+    def run(self, adapter, payload, cancel=None, **kwargs):
+        """adapter.run() with the cache in front of it; extra kwargs go to run()."""
+        t0 = time.perf_counter()
+        key = self.key(adapter, payload)
+        if key is not None:
+            hit = self.get(key)
+            if hit is not None:
+                return self._mark_hit(self._for_input(adapter, payload, hit), t0)
+        out = adapter.run(payload, cancel=cancel, **kwargs)
+        self.put(key, out)
+        return out
+
+    def run_batch(self, adapter, payloads, cancel=None):
+        """adapter.run_batch() for the misses only; duplicates in one batch run once."""
+        t0 = time.perf_counter()
+        results = [None] * len(payloads)
+        pending = OrderedDict()   # key (or index for uncacheable items) -> indices
+        for i, payload in enumerate(payloads):
+            key = self.key(adapter, payload)
+            hit = self.get(key) if key is not None else None
+            if hit is not None:
+                results[i] = self._mark_hit(self._for_input(adapter, payload, hit), t0)
+            else:
+                pending.setdefault(key if key is not None else ("idx", i), []).append(i)
+
+        if pending:
+            groups = list(pending.items())
+            outs = adapter.run_batch([payloads[idx[0]] for _, idx in groups], cancel=cancel)
+            for (key, idx), out in zip(groups, outs):
+                if not isinstance(key, tuple):
+                    self.put(key, out)
+                for n, i in enumerate(idx):
+                    results[i] = out if n == 0 else self._for_input(adapter, payloads[i], dict(out))
+        return results
+
+    @staticmethod
+    def _for_input(adapter, payload, hit):
+        # Keys hash file contents: a hit may come from another file with the same bytes
+        if adapter.input_kind == "image" and "image_path" in hit:
+            hit["image_path"] = payload_value(payload, "image_path", "prompt")
+        return hit
+
+    @staticmethod
+    def _mark_hit(hit, t0):
+        hit["_cached"] = True
+        hit["_ms"] = (time.perf_counter() - t0) * 1000
+        return hit
+
+    def summary(self):
+        total = self.hits + self.misses
+        if not total:
+            return "Cache: empty"
+        return f"Cache: {self.hits} hits / {self.misses} misses ({100 * self.hits / total:.0f}%)"
+
+    # ---------------- Memory tier ---------------- #
+    def _mem_put(self, key, value):
+        with self._lock:
+            self._mem[key] = value
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.memory_items:
+                self._mem.popitem(last=False)
+
+    # ---------------- Disk tier ---------------- #
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key + ".json")
+
+    def _scan_disk(self):
+        entries = []
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    st = os.stat(os.path.join(root, name))
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+
+    def _disk_get(self, key):
+        if not self.disk_dir or key not in self._disk_index:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # keeps eviction order roughly LRU across restarts
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+        return value
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        try:
+            data = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return  # not JSON-safe (e.g. in-memory images); memory tier only
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            self._disk_bytes += size - self._disk_index.pop(key, 0)
+            self._disk_index[key] = size
+            victims = []
+            while self._disk_bytes > self.disk_budget and len(self._disk_index) > 1:
+                old, old_size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= old_size
+                victims.append(old)
+        for old in victims:
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                pass
@@ -1,20 +1,169 @@
-from transformers import pipeline
 from helpers.decorators import log_action, timeit
-from app_model.base import BaseModelAdapter
+from helpers.cancel import check
+from helpers.tracing import span
+from app_model.base import BaseModelAdapter, payload_value
+from app_model.quantization import QuantizationMixin
+from app_model.compiled import CompiledBackendMixin
 
-class TextSentimentAdapter(BaseModelAdapter):
+class TextSentimentAdapter(CompiledBackendMixin, QuantizationMixin, BaseModelAdapter):
     model_name = "distilbert-base-uncased-finetuned-sst-2-english"
     category = "Text Classification"
     description = "Sentiment (positive/negative) using DistilBERT."
+    max_batch_size = 32
+    timeout_s = 30
+    # torchscript / compile backends: token ids padded up to these shapes
+    compiled_inputs = ("input_ids", "attention_mask")
+    batch_buckets = (1, 8, 32)
+    seq_buckets = (16, 32, 64, 128, 256, 512)
+    # Texts longer than one window are scored as overlapping windows and averaged
+    long_documents = True
+    window_tokens = 512   # per window, special tokens included
+    stride = 128          # tokens shared by neighbouring windows
 
     def load(self):
-        self._pipe = pipeline("sentiment-analysis", model=self.model_name)
+        # heavy; imported on first load only
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+
+        self._stage("resolve")
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self._stage("weights")
+        model = self._quantize(AutoModelForSequenceClassification.from_pretrained(self.model_name))
+        self._stage("device")
+        self._pipe = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+        self._compile_backend(model)
+
+    def cache_params(self):
+        params = super().cache_params()
+        # Long inputs are scored differently under each of these
+        params.update(long_documents=self.long_documents, window_tokens=self.window_tokens, stride=self.stride)
+        return params
+
+    def _warmup_payload(self):
+        return "The service was quick and the staff were friendly, but the room was a little cold."
+
+    def _example_inputs(self, batch, seq):
+        import torch
+        return torch.zeros(batch, seq, dtype=torch.long), torch.ones(batch, seq, dtype=torch.long)
 
     @log_action
     @timeit
-    def run(self, payload):
-        text = (payload or "").strip()
+    def run(self, payload, cancel=None):
+        text = payload_value(payload, "prompt", "text")
         if not text:
             return {"result": "Enter text in the box."}
-        out = self._pipe(text)[0]
+        check(cancel)
+        tokens = self._long_tokens(text)
+        if tokens is not None:
+            return self._classify_long(tokens, cancel)
+        out = self._staged_pipeline(text)  # top label, as pipe(text)[0]
+        check(cancel)
         return {"result": f"{out['label']} ({out['score']:.2f})"}
+
+    @log_action
+    @timeit
+    def run_batch(self, payloads, cancel=None):
+        texts = [payload_value(p, "prompt", "text") for p in payloads]
+        results = [{"result": "Enter text in the box."} for _ in texts]
+
+        # Long documents are windowed one by one
+        todo = []
+        for i, text in enumerate(texts):
+            tokens = self._long_tokens(text) if text else None
+            if tokens is not None:
+                results[i] = self._classify_long(tokens, cancel)
+            elif text:
+                todo.append(i)
+
+        # Texts that fit one window go through the model as one padded batch
+        if todo:
+            check(cancel)
+            with span("forward"):  # tokenize + forward + softmax for the whole batch
+                outs = self._pipe([texts[i] for i in todo], batch_size=len(todo))
+            check(cancel)
+            for i, out in zip(todo, outs):
+                results[i] = {"result": f"{out['label']} ({out['score']:.2f})"}
+        return results
+
+    # ---------------- Long documents ---------------- #
+    def _window(self):
+        return min(self.window_tokens, self._pipe.tokenizer.model_max_length)
+
+    def _long_tokens(self, text):
+        """The text's encoding (ids + char offsets) if it needs more than one window, else None."""
+        if not self.long_documents or len(text) <= self.window_tokens - 2:
+            return None  # every token covers at least one character
+        tokenizer = self._pipe.tokenizer
+        if not tokenizer.is_fast:
+            raise ValueError("Long-document mode needs a fast tokenizer")
+        with span("preprocess"):
+            # Tokenized once, untruncated; the windows are cut from these ids
+            enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        if len(enc["input_ids"]) + tokenizer.num_special_tokens_to_add() <= self._window():
+            return None
+        return enc
+
+    def _windows(self, enc):
+        """Overlapping (ids, start char, end char) windows over one encoding."""
+        ids, offsets = enc["input_ids"], enc["offset_mapping"]
+        size = self._window() - self._pipe.tokenizer.num_special_tokens_to_add()
+        step = size - min(self.stride, size // 2)
+        windows, start = [], 0
+        while True:
+            end = min(start + size, len(ids))
+            windows.append((ids[start:end], offsets[start][0], offsets[end - 1][1]))
+            if end == len(ids):
+                return windows
+            start += step
+
+    def _classify_long(self, enc, cancel=None):
+        """Score overlapping windows in batches; token-weighted mean of the probabilities.
+
+        Cost grows linearly with the text: each token is in at most a couple of
+        windows, and only max_batch_size windows are in the model at a time.
+        """
+        import torch
+
+        tokenizer, model = self._pipe.tokenizer, self._pipe.model
+        windows = self._windows(enc)
+        with span("preprocess"):
+            prefix, suffix = _special_ids(tokenizer)
+            batch = tokenizer.pad({"input_ids": [prefix + w + suffix for w, _, _ in windows]}, return_tensors="pt")
+
+        probs = []
+        with span("forward"), torch.no_grad():
+            for start in range(0, len(windows), self.max_batch_size):
+                check(cancel)
+                rows = slice(start, start + self.max_batch_size)
+                logits = model(input_ids=batch["input_ids"][rows].to(model.device),
+                               attention_mask=batch["attention_mask"][rows].to(model.device)).logits
+                probs.append(logits.float().softmax(-1).cpu())
+        check(cancel)
+
+        with span("postprocess"):
+            probs = torch.cat(probs)
+            weights = batch["attention_mask"].sum(dim=1, keepdim=True).float()
+            doc = (probs * weights).sum(dim=0) / weights.sum()
+            labels = model.config.id2label
+
+            segments = []
+            for (_, start, end), p in zip(windows, probs):
+                top = int(p.argmax())
+                segments.append({"start": int(start), "end": int(end),
+                                 "label": labels[top], "score": round(float(p[top]), 4)})
+
+        top = int(doc.argmax())
+        lines = [f"{labels[top]} ({float(doc[top]):.2f}) over {len(segments)} segments"]
+        lines += [f"  {n}. chars {seg['start']}-{seg['end']}: {seg['label']} ({seg['score']:.2f})"
+                  for n, seg in enumerate(segments, 1)]
+        return {"result": "\n".join(lines), "label": labels[top], "score": round(float(doc[top]), 4),
+                "segments": segments}
+
+
+def _special_ids(tokenizer):
+    """Special token ids the tokenizer puts (before, after) one sequence, e.g. ([CLS], [SEP])."""
+    inner = tokenizer("a", add_special_tokens=False)["input_ids"]
+    full = tokenizer("a")["input_ids"]
+    for i in range(len(full) - len(inner) + 1):
+        if full[i:i + len(inner)] == inner:
+            return full[:i], full[i + len(inner):]
+    return [], []
@@ -1,72 +1,353 @@
 # app_model/text_to_image.py
-import os, re, datetime, torch
-from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
-from app_model.base import BaseModelAdapter
+import os, re, random, datetime, threading, logging
+from collections import OrderedDict
+from helpers.cancel import check
+from helpers.decorators import log_action, timeit
+from helpers.tracing import span
+from helpers import image_writer
+from helpers.asset_store import ASSETS_DIR, get_store
+from app_model.base import BaseModelAdapter, payload_value
+
+log = logging.getLogger(__name__)
+
+# Linear map from SD 1.x latent channels to RGB; a rough preview without the VAE
+LATENT_RGB_FACTORS = [
+    [ 0.3512,  0.2297,  0.3227],
+    [ 0.3250,  0.4974,  0.2350],
+    [-0.2829,  0.1762,  0.2721],
+    [-0.2120, -0.2616, -0.7177],
+]
+
+
+def latents_to_preview(latents, size=None):
+    """Cheap RGB approximation of the first latent in a batch (no VAE decode)."""
+    import torch
+    from PIL import Image
+
+    factors = torch.tensor(LATENT_RGB_FACTORS, dtype=torch.float32)
+    rgb = latents[0].detach().float().cpu().permute(1, 2, 0) @ factors
+    rgb = ((rgb + 1) / 2).clamp(0, 1).mul(255).byte().numpy()
+    img = Image.fromarray(rgb, "RGB")
+    return img.resize(size, Image.BILINEAR) if size else img
+
+
+# CPU execution profiles, selected with model_options -> "cpu_profile"
+CPU_PROFILES = {
+    "baseline": {},   # float32, torch default threads (original behaviour)
+    "tuned": {"threads": True, "channels_last": True, "vae_tiling": True},
+    "bf16": {"threads": True, "channels_last": True, "vae_tiling": True, "autocast": "bfloat16"},
+}
+
 
 class TextToImageAdapter(BaseModelAdapter):
     model_name  = "runwayml/stable-diffusion-v1-5"
     category    = "Text-to-Image"
     description = "High-quality text-to-image on CPU (SD 1.5, DPM-Solver)."
+    timeout_s = 900   # 30 steps on CPU can take minutes
+    cacheable = False # random seed per run unless the payload fixes one
+    streams_previews = True
+    preview_every = 5 # steps between live previews; 0 turns them off
+    negative_prompt = "blurry, lowres, bad anatomy, extra limbs, watermark, text, jpeg artifacts"
+    embed_cache_size = 32  # prompts whose CLIP embeddings are kept
+    cpu_profile = "baseline"  # see CPU_PROFILES
+    verify_steps = 4          # reduced-precision profiles are checked against float32 at load
+    verify_threshold = 0.95   # below this similarity the profile falls back to baseline
+
+    # Output encoding: png | webp (lossless) | jpeg; written on a background I/O pool
+    output_format = "png"
+    png_compress_level = 1  # PIL's default 6 costs far more time for a few % of size
+    jpeg_quality = 92
+    output_dir = ASSETS_DIR  # the indexed root, whatever the working directory
+    index_assets = True     # record outputs in the gallery index
+
+    # Quality-oriented CPU defaults
+    steps = 30          # 25–40: more steps = better (slower)
+    guidance_scale = 7.5
+    width = height = 384  # 512x512 looks better but is slower
+    warmup_steps = 2      # denoising steps of the warm-up run (nothing is saved)
+
+    def __init__(self):
+        super().__init__()
+        self._embed_cache = OrderedDict()  # prompt -> prompt_embeds
+        self._embed_lock = threading.Lock()
+        self._neg_embeds = None
+        self._autocast_dtype = None
+        self._threads = None      # intra-op threads for SD runs (None: leave torch's setting)
+        self.profile_check = None # verify_profile() result from the last load
+        self.last_step_ms = []
 
     def load(self):
+        # heavy; imported on first load only
+        import torch
+        from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
+
         # Force CPU on your laptop
         self._device = "cpu"
+
+        self._stage("resolve")
+        try:
+            # Fetch/locate the snapshot first so the weights stage is pure disk reads
+            source = StableDiffusionPipeline.download(self.model_name, use_safetensors=True)
+        except Exception:
+            source = self.model_name
+
+        self._stage("weights")
        # CPU uses float32 for good quality
-        self._pipe = StableDiffusionPipeline.from_pretrained(
-            self.model_name,
+        pipe = StableDiffusionPipeline.from_pretrained(
+            source,
             torch_dtype=torch.float32,
             use_safetensors=True,
         )
         # Better scheduler for quality on CPU
         try:
-            self._pipe.scheduler = DPMSolverMultistepScheduler.from_config(self._pipe.scheduler.config)
+            pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
         except Exception:
             pass
 
         # Disable the filter of NSFW images
-        if hasattr(self._pipe, "safety_checker"):
+        if hasattr(pipe, "safety_checker"):
             def _noop(images, **kwargs): return images, [False] * len(images)
-            self._pipe.safety_checker = _noop
+            pipe.safety_checker = _noop
 
         # Enable memory-efficient attention
         for fn in ("enable_attention_slicing", "enable_vae_slicing"):
-            try: getattr(self._pipe, fn)()
+            try: getattr(pipe, fn)()
             except Exception: pass
 
-        self._pipe.set_progress_bar_config(disable=True)
-        self._pipe.to(self._device)
+        pipe.set_progress_bar_config(disable=True)
+        self._stage("device")
+        pipe = pipe.to(self._device)
+        self._apply_profile(pipe)
+        self._pipe = pipe
+
+        # The negative prompt never changes: encode it once here
+        self._embed_cache.clear()
+        self._neg_embeds = self._encode(self.negative_prompt)
+        self._check_profile()
+
+    def _check_profile(self):
+        # Only reduced-precision autocast changes the maths; check it once per load
+        self.profile_check = None
+        if self._autocast_dtype is None or not self.verify_steps:
+            return
+        self.profile_check = self.verify_profile(steps=self.verify_steps, threshold=self.verify_threshold)
+        if not self.profile_check["passed"]:
+            log.warning("cpu_profile %r: similarity %.3f to float32 is below %.2f; using baseline",
+                        self.cpu_profile, self.profile_check["similarity"], self.verify_threshold)
+            self.cpu_profile = "baseline"
+            self._apply_profile(self._pipe)
+
+    def unload(self):
+        super().unload()
+        self._embed_cache.clear()
+        self._neg_embeds = None
+
+    def _encode(self, text):
+        import torch
+        with torch.no_grad():
+            embeds, _ = self._pipe.encode_prompt(text, self._device, 1, False)
+        return embeds
+
+    def _prompt_embeds(self, prompt):
+        """CLIP text embeddings for `prompt`, through a small LRU."""
+        with self._embed_lock:
+            embeds = self._embed_cache.get(prompt)
+            if embeds is not None:
+                self._embed_cache.move_to_end(prompt)
+                return embeds
+        embeds = self._encode(prompt)
+        with self._embed_lock:
+            self._embed_cache[prompt] = embeds
+            while len(self._embed_cache) > self.embed_cache_size:
+                self._embed_cache.popitem(last=False)
+        return embeds
+
+    # ---------------- Execution profile ---------------- #
+    def _apply_profile(self, pipe):
+        import torch
+
+        opts = CPU_PROFILES.get(self.cpu_profile, {})
+        # Applied around each SD run only (see _run_threads), not to the whole process
+        self._threads = _physical_cores() if opts.get("threads") else None
+        # Set both ways: the baseline fallback must undo what a tuned profile turned on
+        memory_format = torch.channels_last if opts.get("channels_last") else torch.contiguous_format
+        for name in ("unet", "vae"):
+            module = getattr(pipe, name, None)
+            if module is not None:
+                module.to(memory_format=memory_format)
+        try:
+            if opts.get("vae_tiling"):
+                pipe.enable_vae_tiling()
+            else:
+                pipe.disable_vae_tiling()
+        except Exception:
+            pass
+
+        self._autocast_dtype = None
+        if opts.get("autocast") == "bfloat16" and _cpu_supports_bf16():
+            self._autocast_dtype = torch.bfloat16
+
+    def _run_threads(self):
+        """Use the profile's thread count for one run, then restore the previous one."""
+        import contextlib
+        import torch
+
+        if not self._threads:
+            return contextlib.nullcontext()
+
+        @contextlib.contextmanager
+        def scoped():
+            previous = torch.get_num_threads()
+            torch.set_num_threads(self._threads)
+            try:
+                yield
+            finally:
+                torch.set_num_threads(previous)
+        return scoped()
+
+    def _autocast(self, enabled=True):
+        import contextlib
+        import torch
+        if enabled and self._autocast_dtype is not None:
+            return torch.autocast("cpu", dtype=self._autocast_dtype)
+        return contextlib.nullcontext()
+
+    def _warmup_run(self, cancel):
+        # run() would save and index an image; the denoising loop is what needs warming
+        self._generate("a photo of a house", self.warmup_steps, self.guidance_scale,
+                       self.width, self.height, 0, cancel)
+        return True
+
+    # ---------------- Generation ---------------- #
+    def _generate(self, prompt, steps, cfg, w, h, seed, cancel=None, progress=None, autocast=True):
+        """One denoising run -> (PIL image, per-step latencies in ms)."""
+        import time
+        import torch
+
+        step_ms = []
+        last = [time.perf_counter()]
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            now = time.perf_counter()
+            step_ms.append((now - last[0]) * 1000)
+            last[0] = now
+            # Raising here aborts the denoising loop between steps
+            check(cancel)
+            if progress is not None:
+                done = step + 1
+                preview = None
+                if self.preview_every and (done % self.preview_every == 0) and done < steps:
+                    preview = latents_to_preview(callback_kwargs["latents"], (w, h))
+                progress(done, steps, preview)
+            return callback_kwargs
+
+        check(cancel)
+        generator = torch.Generator("cpu").manual_seed(seed)
+        with span("preprocess"):
+            prompt_embeds = self._prompt_embeds(prompt)
+        last[0] = time.perf_counter()
+        with span("denoise"), torch.inference_mode(), self._autocast(autocast), self._run_threads():
+            image = self._pipe(
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=self._neg_embeds,
+                num_inference_steps=steps,
+                guidance_scale=cfg,
+                height=(h//8)*8, width=(w//8)*8,
+                generator=generator,
+                callback_on_step_end=on_step_end,
+            ).images[0]
+        return image, step_ms
 
-    def run(self, payload):
+    @log_action
+    @timeit
+    def run(self, payload, cancel=None, progress=None):
+        """progress(step, total, preview) is called after every denoising step;
+        `preview` is a PIL image every `preview_every` steps and None otherwise."""
         # Accept either a raw path string or a UI dict
-        if isinstance(payload, dict):
-            prompt = (payload.get("prompt") or payload.get("text") or "").strip()
-        else:
-            prompt = (payload or "").strip()
+        prompt = payload_value(payload, "prompt", "text")
 
         if not prompt:
             return {"result": "Enter a text prompt."}
 
-        # Quality-oriented CPU defaults
-        steps = 30         # 25–40: more steps = better (slower)
-        cfg   = 7.5
-        h, w  = 384, 384   # 512x512 looks better but is slower
-        neg   = "blurry, lowres, bad anatomy, extra limbs, watermark, text, jpeg artifacts"
-
-        image = self._pipe(
-            prompt=prompt,
-            negative_prompt=neg,
-            num_inference_steps=steps,
-            guidance_scale=cfg,
-            height=(h//8)*8, width=(w//8)*8
-        ).images[0]
-
-        os.makedirs("assets", exist_ok=True)
+        # Quality-oriented CPU defaults; a dict payload may override them
+        opts  = payload if isinstance(payload, dict) else {}
+        steps = int(opts.get("steps") or self.steps)
+        cfg   = float(opts.get("guidance_scale") or self.guidance_scale)
+        w     = int(opts.get("width") or self.width)
+        h     = int(opts.get("height") or self.height)
+        seed  = int(opts["seed"]) if opts.get("seed") is not None else random.randrange(2**31)
+
+        image, step_ms = self._generate(prompt, steps, cfg, w, h, seed, cancel, progress)
+        self.last_step_ms = step_ms  # for info(); warm-up runs don't touch it
+
+        os.makedirs(self.output_dir, exist_ok=True)
         ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         snippet = re.sub(r"[^A-Za-z0-9_]+","_", "_".join(prompt.split()[:6]) or "image")[:48].strip("_")
-        path = os.path.join("assets", f"generated_{snippet}_{ts}_{w}x{h}_s{steps}.png")
-        image.save(path)
+        ext = image_writer.extension(self.output_format)
+        path = os.path.join(self.output_dir, f"generated_{snippet}_{ts}_{w}x{h}_s{steps}{ext}")
+        # Encoding happens off this thread; the UI gets the in-memory image right away
+        saved = image_writer.save_async(image, path, self.output_format,
+                                        **image_writer.save_options(self.output_format, self.png_compress_level, self.jpeg_quality))
+        # Indexed (with a thumbnail) once the file is on disk, for the gallery
+        if self.index_assets:
+            get_store().record_async(saved, path, image, prompt=prompt, seed=seed, steps=steps, width=w, height=h,
+                                     model=self.model_name, total_ms=sum(step_ms),
+                                     step_ms=sum(step_ms) / max(len(step_ms), 1))
 
         return {
             "result": f"Image generated → {path}",
             "image_path": path,
+            "image": image,
+            "seed": seed,
+            "_step_ms": sum(step_ms) / max(len(step_ms), 1),
+        }
+
+    def verify_profile(self, prompt="a red car parked on a street", seed=0, steps=10, threshold=0.95):
+        """Compare the active profile's output with a float32 run of the same seed.
+
+        Threads, memory format and VAE tiling do not change the maths beyond float
+        rounding, so the reference run only switches reduced-precision autocast off.
+        Returns similarity in [0, 1] (1 - mean absolute pixel error) and step latencies.
+        """
+        import numpy as np
+
+        ref, ref_ms = self._generate(prompt, steps, self.guidance_scale, self.width, self.height, seed, autocast=False)
+        out, out_ms = self._generate(prompt, steps, self.guidance_scale, self.width, self.height, seed)
+        diff = np.abs(np.asarray(out, dtype=np.float32) - np.asarray(ref, dtype=np.float32))
+        similarity = 1.0 - float(diff.mean()) / 255.0
+        return {
+            "profile": self.cpu_profile,
+            "similarity": similarity,
+            "passed": similarity >= threshold,
+            "step_ms": sum(out_ms) / max(len(out_ms), 1),
+            "baseline_step_ms": sum(ref_ms) / max(len(ref_ms), 1),
         }
+
+    def info(self):
+        data = super().info()
+        data["CPU profile"] = self.cpu_profile
+        if self.profile_check:
+            data["Profile check"] = (f"similarity {self.profile_check['similarity']:.3f} "
+                                     f"({'passed' if self.profile_check['passed'] else 'failed, fell back to baseline'})")
+        if self.last_step_ms:
+            data["Step latency"] = f"{sum(self.last_step_ms) / len(self.last_step_ms):.0f} ms/step"
+        return data
+
+
+def _physical_cores():
+    try:
+        import psutil
+        cores = psutil.cpu_count(logical=False)
+        if cores:
+            return cores
+    except Exception:
+        pass
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def _cpu_supports_bf16():
+    import torch
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
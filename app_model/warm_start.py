@@ -0,0 +1,118 @@
+# app_model/warm_start.py
+"""Preload the models this installation uses most, in the background at launch.
+
+Runs, last use and measured memory cost per model are recorded in app_config.json
+(helpers.config.record_usage). At launch the top-ranked models are loaded one by
+one through the residency manager, which also runs their warm-up, as long as the
+memory budget and the system's available memory allow it.
+"""
+import threading
+import time
+
+from helpers.cancel import CancelToken, Cancelled
+from helpers.memory import available_memory
+
+MB = 1024 * 1024
+
+DEFAULTS = {
+    "enabled": True,
+    "max_models": 2,          # preload at most this many
+    "min_uses": 3,            # runs before a model counts as "usually used"
+    "half_life_days": 14,     # older use counts for less
+    "min_available_mb": 1024, # leave at least this much memory free for everything else
+}
+
+
+def likely_models(cfg, now=None):
+    """Names worth preloading, most likely first: run count decayed by time since last use."""
+    opts = {**DEFAULTS, **(cfg.get("warm_start") or {})}
+    if not opts["enabled"]:
+        return []
+    now = now or time.time()
+    scored = []
+    for name, entry in (cfg.get("model_usage") or {}).items():
+        count = entry.get("count", 0)
+        if count < opts["min_uses"]:
+            continue
+        age_days = max(now - entry.get("last_used", 0), 0) / 86400
+        scored.append((count * 0.5 ** (age_days / opts["half_life_days"]), name))
+    scored.sort(reverse=True)
+    return [name for _, name in scored[:opts["max_models"]]]
+
+
+class WarmStarter:
+    """Loads likely models on a daemon thread; reports through on_event(kind, name, detail).
+
+    kind is "loaded" (detail: seconds), "skipped" (detail: reason) or "failed"
+    (detail: error). Models loaded here are also warmed up. Never evicts anything:
+    a model that doesn't fit is skipped. Waits while busy() is true, so a real run
+    gets the CPU first.
+    """
+
+    def __init__(self, residency, cfg, busy=None, on_event=None):
+        self.residency = residency
+        self.opts = {**DEFAULTS, **(cfg.get("warm_start") or {})}
+        self.usage = cfg.get("model_usage") or {}
+        self.names = [n for n in likely_models(cfg) if n in residency.models]
+        self.busy = busy or (lambda: False)
+        self.on_event = on_event or (lambda kind, name, detail: None)
+        self._token = CancelToken()
+        self._remaining = set(self.names)  # not yet loaded, skipped or failed
+        self.done = not self.names
+
+    def start(self):
+        if self.names:
+            threading.Thread(target=self._run, daemon=True, name="warm-start").start()
+
+    def cancel(self):
+        self._token.cancel()
+
+    def pending(self, name):
+        """True while `name` is queued for, or in the middle of, its warm-start load."""
+        return not self.done and name in self._remaining
+
+    def _run(self):
+        try:
+            self._load_all()
+        finally:
+            self.done = True
+
+    def _load_all(self):
+        for name in self.names:
+            try:
+                self._load_one(name)
+            finally:
+                self._remaining.discard(name)
+            if self._token.cancelled:
+                return
+
+    def _load_one(self, name):
+        while self.busy() and not self._token.cancelled:
+            time.sleep(0.2)
+        if self._token.cancelled:
+            return
+        reason = self._no_room(name)
+        if reason:
+            self.on_event("skipped", name, reason)
+            return  # a smaller model further down may still fit
+        t0 = time.perf_counter()
+        try:
+            self.residency.ensure_loaded(name, cancel=self._token, warmup=True)
+        except Cancelled:
+            return
+        except Exception as ex:
+            self.on_event("failed", name, str(ex))
+            return
+        self.on_event("loaded", name, time.perf_counter() - t0)
+
+    def _no_room(self, name):
+        cost = self.residency.known_cost(name) or self.usage.get(name, {}).get("cost_mb", 0) * MB
+        if not cost:
+            return "memory cost not measured yet"
+        budget = self.residency.budget
+        if budget and self.residency.used() + cost > budget:
+            return f"needs {cost / MB:.0f} MB, over the memory budget"
+        avail = available_memory()
+        if avail and avail - cost < self.opts["min_available_mb"] * MB:
+            return f"needs {cost / MB:.0f} MB, only {avail / MB:.0f} MB available"
+        return None
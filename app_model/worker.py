@@ -0,0 +1,423 @@
+# app_model/worker.py
+"""Optional out-of-process execution: models live in a worker process, the app talks to proxies.
+
+Selected with "process_mode": "worker" in app_config.json. The worker owns the
+torch/transformers/diffusers state, so tokenising, decoding and post-processing
+never hold the GUI's GIL, and a native crash or a leak only takes down the worker,
+which is started again on the next request. Requests and small results go over a
+Pipe; images and arrays (generated images, live previews) go through
+multiprocessing.shared_memory instead of being pickled.
+"""
+import builtins
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+from helpers.cancel import CancelToken, Cancelled, TimedOut
+from helpers import tracing
+from app_model.registry import ModelRegistry
+
+
+class WorkerError(RuntimeError):
+    """An exception raised inside the worker that has no local equivalent."""
+
+
+class WorkerCrashed(WorkerError):
+    """The worker process died while a request was in flight."""
+
+
+# ---------------- Shared-memory transfer ---------------- #
+def _pack(value):
+    """Replace PIL images / numpy arrays / tensors with shared-memory descriptors (worker side)."""
+    if isinstance(value, dict):
+        return {k: _pack(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_pack(v) for v in value)
+    if hasattr(value, "detach") and hasattr(value, "numpy"):  # torch tensor
+        value = value.detach().cpu().numpy()
+    if hasattr(value, "tobytes") and hasattr(value, "mode") and hasattr(value, "size"):  # PIL image
+        return _to_shm(value.tobytes(), kind="image", mode=value.mode, size=value.size)
+    if hasattr(value, "__array_interface__"):  # numpy array
+        import numpy as np
+        arr = np.ascontiguousarray(value)
+        return _to_shm(arr.tobytes(), kind="array", dtype=arr.dtype.str, shape=arr.shape)
+    return value
+
+
+def _to_shm(data, **meta):
+    shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+    shm.buf[:len(data)] = data
+    shm.close()  # the segment lives on until the receiver unlinks it
+    return {"__shm__": shm.name, "nbytes": len(data), **meta}
+
+
+def _unpack(value):
+    """Inverse of _pack (app side); copies out of shared memory and frees the segment."""
+    if isinstance(value, dict):
+        if "__shm__" in value:
+            return _from_shm(value)
+        return {k: _unpack(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unpack(v) for v in value)
+    return value
+
+
+def _from_shm(desc):
+    shm = shared_memory.SharedMemory(name=desc["__shm__"])
+    try:
+        data = bytes(shm.buf[:desc["nbytes"]])
+    finally:
+        shm.close()
+        shm.unlink()
+    if desc["kind"] == "image":
+        from PIL import Image
+        return Image.frombytes(desc["mode"], tuple(desc["size"]), data)
+    import numpy as np
+    return np.frombuffer(data, dtype=desc["dtype"]).reshape(desc["shape"])
+
+
+# ---------------- Worker process side ---------------- #
+def _serve(conn):
+    """Worker main loop: each request runs on its own thread so cancels arrive mid-run."""
+    from app_model.registry import build_models
+    from helpers import image_writer
+    from helpers.memory import release_memory
+
+    models = build_models()
+    tokens = {}
+    send_lock = threading.Lock()
+
+    def send(*msg):
+        with send_lock:
+            conn.send(msg)
+
+    def job(req_id, op, name, options, args):
+        token = tokens[req_id]
+        try:
+            if op == "metrics":
+                send("result", req_id, tracing.drain())
+                return
+            adapter = models[name].configure(**options)
+            if op == "load":
+                adapter.load_staged(lambda stage, i, n: send("stage", req_id, stage, i, n), token, bool(args))
+                out = {"param_bytes": adapter.param_bytes(), "info": adapter.info()}
+            elif op == "run":
+                payload, want_progress = args
+                kwargs = {}
+                if want_progress:
+                    kwargs["progress"] = lambda step, total, preview: send(
+                        "progress", req_id, step, total, _pack(preview))
+                out = adapter.run(payload, cancel=token, **kwargs)
+                _wait_saved([out], image_writer)
+                out = _pack(out)
+            elif op == "run_batch":
+                outs = adapter.run_batch(args, cancel=token)
+                _wait_saved(outs, image_writer)
+                out = _pack(outs)
+            elif op == "unload":
+                adapter.unload()
+                release_memory()
+                out = None
+            else:
+                out = adapter.info()
+            send("result", req_id, out)
+        except BaseException as ex:
+            send("error", req_id, type(ex).__name__, str(ex))
+        finally:
+            tokens.pop(req_id, None)
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break  # the app went away
+        op = msg[0]
+        if op == "shutdown":
+            break
+        if op == "cancel":
+            token = tokens.get(msg[1])
+            if token is not None:
+                token.cancel()
+        elif op == "prefetch":
+            models.prefetch(msg[1])
+        else:
+            req_id, name, options, args = msg[1:]
+            tokens[req_id] = CancelToken()
+            threading.Thread(target=job, args=(req_id, op, name, options, args), daemon=True).start()
+
+    # Generated images are encoded on a background pool; don't exit with saves still queued
+    try:
+        image_writer.wait_all()
+    except Exception:
+        pass
+
+
+def _wait_saved(outs, image_writer):
+    # The app's image_writer.wait() can't see this process's queue: reply once files exist
+    for out in outs:
+        path = out.get("image_path") if isinstance(out, dict) else None
+        if path:
+            image_writer.wait(path)
+
+
+# ---------------- App side ---------------- #
+class WorkerProcess:
+    """Owns the worker process and routes replies back to the threads waiting on them."""
+
+    kill_after_s = 10  # a cancelled request that doesn't stop by then gets the worker restarted
+    stop_timeout_s = 60  # on shutdown, time the worker gets to finish encoding queued images
+
+    def __init__(self):
+        self._ctx = mp.get_context("spawn")  # no forked torch/Tk state
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._proc = None
+        self._conn = None
+        self._pending = {}  # request id -> (generation, Queue of replies)
+        self._ids = itertools.count(1)
+        self.generation = 0  # bumps on every (re)start; loads from older generations are gone
+        self.restarts = 0
+
+    def start(self):
+        with self._lock:
+            if self._proc is not None and self._proc.is_alive():
+                return
+            if self._proc is not None:
+                self.restarts += 1
+            parent, child = self._ctx.Pipe()
+            proc = self._ctx.Process(target=_serve, args=(child,), daemon=True, name="model-worker")
+            proc.start()
+            child.close()
+            self._proc, self._conn = proc, parent
+            self.generation += 1
+            threading.Thread(target=self._read, args=(proc, parent, self.generation), daemon=True).start()
+
+    def alive(self):
+        return self._proc is not None and self._proc.is_alive()
+
+    @property
+    def pid(self):
+        return self._proc.pid if self.alive() else None
+
+    def stop(self):
+        with self._lock:
+            proc, self._proc = self._proc, None
+        if proc is not None and proc.is_alive():
+            try:
+                self._send(("shutdown",))
+            except OSError:
+                pass
+            proc.join(self.stop_timeout_s)
+            if proc.is_alive():
+                proc.kill()
+
+    def restart(self):
+        """Kill the worker (e.g. stuck in native code); the next request starts a fresh one."""
+        with self._lock:
+            proc = self._proc
+        if proc is not None and proc.is_alive():
+            proc.kill()
+            proc.join(5)
+
+    def prefetch(self, name):
+        self.start()
+        self._send(("prefetch", name))
+
+    def call(self, op, name, options, args=None, cancel=None, on_event=None):
+        """Send one request and block until its reply; events go to on_event(kind, *fields)."""
+        self.start()
+        replies = queue.Queue()
+        req_id = next(self._ids)
+        self._pending[req_id] = (self.generation, replies)
+        cancel_sent = None
+        try:
+            self._send((op, req_id, name, options, args))
+            while True:
+                try:
+                    msg = replies.get(timeout=0.1)
+                except queue.Empty:
+                    if cancel is not None and cancel.cancelled:
+                        if cancel_sent is None:
+                            self._send(("cancel", req_id))
+                            cancel_sent = time.monotonic()
+                        elif time.monotonic() - cancel_sent > self.kill_after_s:
+                            self.restart()
+                    continue
+                kind = msg[0]
+                if kind == "result":
+                    return msg[2]
+                if kind == "error":
+                    raise _remote_error(msg[2], msg[3], cancel)
+                if kind == "crashed":
+                    if cancel is not None and cancel.cancelled:
+                        cancel.check()  # we killed it ourselves
+                    raise WorkerCrashed(f"Model worker exited (code {msg[2]}); it restarts on the next request")
+                if on_event is not None:
+                    on_event(kind, *msg[2:])
+        finally:
+            self._pending.pop(req_id, None)
+
+    def _send(self, msg):
+        with self._send_lock:
+            self._conn.send(msg)
+
+    def _read(self, proc, conn, generation):
+        # Shared memory is copied out and freed here, even if nobody waits for the reply any more
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                break
+            entry = self._pending.get(msg[1])
+            msg = tuple(_unpack(m) for m in msg)
+            if entry is not None:
+                entry[1].put(msg)
+        proc.join(1)
+        for req_id, (gen, replies) in list(self._pending.items()):
+            if gen == generation:
+                replies.put(("crashed", req_id, proc.exitcode))
+
+
+def _remote_error(name, message, cancel):
+    if name in ("Cancelled", "TimedOut"):
+        if cancel is not None and cancel.cancelled:
+            try:
+                cancel.check()
+            except Cancelled as ex:
+                return ex  # same exception (and timeout text) a local run would raise
+        return TimedOut(message) if name == "TimedOut" else Cancelled(message)
+    cls = getattr(builtins, name, None)
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        try:
+            return cls(message)
+        except Exception:
+            pass
+    return WorkerError(f"{name}: {message}")
+
+
+class RemoteAdapter:
+    """Proxy with the BaseModelAdapter interface for an adapter living in the worker.
+
+    Settings (model_name, timeout_s, cache_params() ...) come from a local, never
+    loaded instance of the same class, so the UI, result cache and residency manager
+    treat it like the real thing. configure() changes are sent along with every call.
+    """
+
+    def __init__(self, worker, name, template):
+        self._worker = worker
+        self._name = name
+        self._template = template
+        self._options = {}
+        self._loaded_gen = None   # worker generation that holds our weights
+        self._param_bytes = 0
+        self._info = None
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(self._template, attr)
+
+    def configure(self, **options):
+        self._template.configure(**options)
+        self._options.update(options)
+        return self
+
+    # ---------------- Loading ---------------- #
+    def load(self):
+        self.load_staged()
+
+    def load_staged(self, progress=None, cancel=None, warmup=False):
+        on_event = (lambda kind, stage, index, total: progress(stage, index, total)) if progress else None
+        out = self._call("load", warmup, cancel, on_event)
+        self._loaded_gen = self._worker.generation
+        self._param_bytes = out["param_bytes"]
+        self._info = out["info"]
+
+    def warmup(self):
+        pass  # part of load_staged() in the worker
+
+    def unload(self):
+        if self.is_loaded():
+            try:
+                self._call("unload")
+            except WorkerError:
+                pass
+        self._loaded_gen = None
+
+    def is_loaded(self):
+        return self._loaded_gen == self._worker.generation and self._worker.alive()
+
+    # ---------------- Running ---------------- #
+    def run(self, payload, cancel=None, progress=None):
+        self._reload_after_crash(cancel)
+        on_event = (lambda kind, step, total, preview: progress(step, total, preview)) if progress else None
+        out = self._call("run", (payload, progress is not None), cancel, on_event)
+        self._info = None
+        return out
+
+    def run_batch(self, payloads, cancel=None):
+        self._reload_after_crash(cancel)
+        return self._call("run_batch", list(payloads), cancel)
+
+    def _reload_after_crash(self, cancel):
+        # Same run() semantics as in-process: a restarted worker reloads what it had
+        if self._loaded_gen is not None and not self.is_loaded():
+            self.load_staged(cancel=cancel)
+
+    def _call(self, op, args=None, cancel=None, on_event=None):
+        return self._worker.call(op, self._name, self._options, args, cancel, on_event)
+
+    # ---------------- Introspection ---------------- #
+    def cache_params(self):
+        return self._template.cache_params()
+
+    def torch_modules(self):
+        return iter(())  # they live in the worker
+
+    def param_bytes(self):
+        return self._param_bytes if self.is_loaded() else 0
+
+    def info(self):
+        if self._info is None and self.is_loaded():
+            self._info = self._call("info")
+        data = dict(self._info or self._template.info())
+        pid = self._worker.pid
+        data["Process"] = f"worker (pid {pid})" if pid else "worker (stopped)"
+        return data
+
+
+class WorkerRegistry(ModelRegistry):
+    """ModelRegistry whose adapters are RemoteAdapter proxies sharing one worker process."""
+
+    def __init__(self, specs, options=None):
+        super().__init__(specs, options)
+        self.worker = WorkerProcess()
+        # Adapter stages are timed in the worker; merge them into this process's histograms
+        tracing.add_source(self._worker_metrics)
+
+    def _worker_metrics(self):
+        return self.worker.call("metrics", None, {}) if self.worker.alive() else []
+
+    def _create(self, name):
+        return RemoteAdapter(self.worker, name, self._specs[name].create()).configure(
+            **self._options.get(name, {}))
+
+    def close(self):
+        # Lets the worker finish its queued image saves instead of dying with the app
+        try:
+            tracing.merge(self._worker_metrics())  # the last stage timings before it exits
+        except Exception:
+            pass
+        tracing.remove_source(self._worker_metrics)
+        self.worker.stop()
+
+    def prefetch(self, name):
+        # The heavy imports belong in the worker, not in the app
+        if name not in self._specs:
+            return None
+        t = threading.Thread(target=self.worker.prefetch, args=(name,), daemon=True)
+        t.start()
+        return t
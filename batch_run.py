@@ -0,0 +1,297 @@
+# batch_run.py
+"""Headless batch runner: streams prompts or images through one adapter, no Tkinter needed.
+
+Examples:
+    python batch_run.py --model text-classification --input prompts.jsonl --output out.jsonl
+    python batch_run.py --model image-to-text --input photos/ --output captions.csv --resume
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from helpers.cancel import CancelToken
+from helpers.config import load_config
+from helpers import image_writer, tracing
+from helpers.images import iter_images
+from app_model.registry import build_models, model_slug
+from app_model.compiled import BACKENDS
+from app_model.result_cache import ResultCache
+
+CSV_FIELDS = ["id", "input", "result", "ms", "error"]
+
+
+# ---------------- Input ---------------- #
+def iter_jsonl(path):
+    """Yield (id, payload) from a JSONL file of strings or objects."""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, dict):
+                yield str(item.get("id", lineno)), item
+            else:
+                yield str(lineno), str(item)
+
+
+def iter_inputs(path):
+    if os.path.isdir(path):
+        return iter_images(path)
+    return iter_jsonl(path)
+
+
+def input_text(payload):
+    if isinstance(payload, dict):
+        return payload.get("image_path") or payload.get("prompt") or payload.get("text") or ""
+    return payload
+
+
+# ---------------- Output ---------------- #
+class ResultWriter:
+    """Appends one record per item to JSONL or CSV, flushing after every batch."""
+
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        if exists:
+            _drop_partial_line(path)
+        self._f = open(path, "a", encoding="utf-8", newline="")
+        self._csv = None
+        self.tokens = 0  # generated tokens (captioning), for the summary
+        if fmt == "csv":
+            self._csv = csv.DictWriter(self._f, fieldnames=CSV_FIELDS)
+            if not exists:
+                self._csv.writeheader()
+
+    def write(self, item_id, payload, out, error=None):
+        out = out or {}
+        self.tokens += (out.get("_gen") or {}).get("tokens", 0)
+        record = {
+            "id": item_id,
+            "input": input_text(payload),
+            "result": out.get("result", ""),
+            "ms": round(out.get("_ms", 0.0), 2),
+            "error": str(error) if error else "",
+        }
+        if self._csv:
+            self._csv.writerow(record)
+        else:
+            # Keep any extra adapter fields (paths etc.) in the JSONL output
+            extra = {k: v for k, v in out.items() if k not in ("result", "_ms") and _json_safe(v)}
+            self._f.write(json.dumps({**record, **extra}, ensure_ascii=False, default=str) + "\n")
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def _json_safe(value):
+    return value is None or isinstance(value, (str, int, float, bool, list, dict))
+
+
+def _drop_partial_line(path):
+    # A crash mid-write can leave a truncated last line; cut back to the last newline
+    with open(path, "rb+") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 1))
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        data = f.read()
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+def load_done_ids(path, fmt):
+    """IDs already present in a previous (possibly interrupted) output file.
+
+    Rows that failed are retried, so they are removed from the file here;
+    otherwise the retry would append a second record for the same id.
+    """
+    done = set()
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return done
+    _drop_partial_line(path)
+    kept, dropped = [], False
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                if row.get("id") and not row.get("error"):
+                    done.add(row["id"])
+                    kept.append(row)
+                else:
+                    dropped = True
+        else:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    dropped = True
+                    continue
+                if not row.get("error"):
+                    done.add(str(row.get("id")))
+                    kept.append(line)
+                else:
+                    dropped = True
+    if dropped:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            if fmt == "csv":
+                out = csv.DictWriter(f, fieldnames=reader.fieldnames or CSV_FIELDS)
+                out.writeheader()
+                out.writerows(kept)
+            else:
+                f.writelines(kept)
+        os.replace(tmp, path)
+    return done
+
+
+# ---------------- Runner ---------------- #
+def run_batches(adapter, items, writer, batch_size, report_every=100, cache=None):
+    """Feed items through adapter.run_batch(); failed batches are retried item by item.
+
+    Every call gets a CancelToken with the adapter's timeout, so one stuck item
+    cannot hold up the whole job.
+    """
+    count, t0, next_report = 0, time.perf_counter(), report_every
+    batch = []
+
+    def flush_batch():
+        nonlocal count
+        try:
+            token = CancelToken(timeout=adapter.timeout_s * len(batch))
+            payloads = [p for _, p in batch]
+            if cache is not None:
+                outs = cache.run_batch(adapter, payloads, cancel=token)
+            else:
+                outs = adapter.run_batch(payloads, cancel=token)
+            for (item_id, payload), out in zip(batch, outs):
+                writer.write(item_id, payload, out)
+        except Exception:
+            for item_id, payload in batch:
+                try:
+                    out = adapter.run(payload, cancel=CancelToken(timeout=adapter.timeout_s))
+                    writer.write(item_id, payload, out)
+                except Exception as ex:
+                    writer.write(item_id, payload, None, error=ex)
+        writer.flush()
+        count += len(batch)
+        batch.clear()
+
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush_batch()
+            if count >= next_report:
+                rate = count / max(time.perf_counter() - t0, 1e-9)
+                print(f"[batch] {count} items, {rate:.2f} items/s", file=sys.stderr)
+                next_report = count + report_every
+    if batch:
+        flush_batch()
+
+    elapsed = time.perf_counter() - t0
+    return count, elapsed
+
+
+def parse_options(pairs):
+    """["num_beams=3", "decoding=beam"] -> {"num_beams": 3, "decoding": "beam"}; values are JSON if they parse."""
+    options = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"--option expects KEY=VALUE, got {pair!r}")
+        try:
+            options[key.strip()] = json.loads(value)
+        except ValueError:
+            options[key.strip()] = value
+    return options
+
+
+def parse_args(argv=None):
+    slugs = [model_slug(name) for name in build_models()]  # names only, nothing imported
+    ap = argparse.ArgumentParser(description="Run an adapter over a JSONL file or an image directory.")
+    ap.add_argument("--model", required=True, choices=slugs)
+    ap.add_argument("--input", required=True, help="JSONL file of prompts, or a directory of images")
+    ap.add_argument("--output", required=True, help="results file (.jsonl or .csv)")
+    ap.add_argument("--format", choices=["jsonl", "csv"], help="output format (default: from extension)")
+    ap.add_argument("--batch-size", type=int, default=0, help="items per forward pass (default: adapter max)")
+    ap.add_argument("--resume", action="store_true", help="skip items already written to --output")
+    ap.add_argument("--limit", type=int, default=0, help="stop after this many new items")
+    ap.add_argument("--report-every", type=int, default=100)
+    ap.add_argument("--no-cache", action="store_true", help="bypass the shared result cache")
+    ap.add_argument("--quantize", action="store_true", help="dynamic int8 Linear layers (CPU; text/image classification, image-to-text)")
+    ap.add_argument("--backend", choices=BACKENDS,
+                    help="execution backend for text/image classification")
+    ap.add_argument("--option", action="append", default=[], metavar="KEY=VALUE",
+                    help="adapter setting, e.g. decoding=beam, num_beams=3, max_new_tokens=30 (repeatable)")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+
+    cfg = load_config()
+    metrics_dir = tracing.from_config(cfg)
+    models = build_models(cfg.get("model_options"), cfg.get("process_mode", "inline"))
+    names = {model_slug(name): name for name in models}
+    adapter = models[names[args.model]]
+    batch_size = args.batch_size or adapter.max_batch_size
+    if args.quantize:
+        if not hasattr(adapter, "precision"):
+            print(f"[batch] {args.model} has no int8 mode", file=sys.stderr)
+            return 2
+        adapter.configure(precision="int8")
+    if args.backend:
+        if not hasattr(adapter, "backend"):
+            print(f"[batch] {args.model} has no compiled backend", file=sys.stderr)
+            return 2
+        adapter.configure(backend=args.backend)
+    if args.option:
+        adapter.configure(**parse_options(args.option))
+
+    if not args.resume and os.path.exists(args.output):
+        os.remove(args.output)
+    done = load_done_ids(args.output, fmt) if args.resume else set()
+    if done:
+        print(f"[batch] resuming, {len(done)} items already done", file=sys.stderr)
+
+    items = ((i, p) for i, p in iter_inputs(args.input) if i not in done)
+    if args.limit:
+        items = (item for n, item in zip(range(args.limit), items))
+
+    t0 = time.perf_counter()
+    adapter.load()
+    print(f"[batch] loaded {adapter.model_name} in {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+
+    cache = None if args.no_cache else ResultCache.from_config(cfg)
+    writer = ResultWriter(args.output, fmt)
+    try:
+        count, elapsed = run_batches(adapter, items, writer, batch_size, args.report_every, cache)
+    finally:
+        writer.close()
+        image_writer.wait_all()  # generated images are encoded in the background
+        models.close()           # in worker mode, waits for the worker's own image saves
+    if cache is not None:
+        print(f"[batch] {cache.summary()}", file=sys.stderr)
+    if metrics_dir:
+        tracing.export(metrics_dir)
+        print(f"[batch] stage timings in {metrics_dir}", file=sys.stderr)
+
+    rate = count / elapsed if elapsed else 0.0
+    print(f"[batch] done: {count} items in {elapsed:.1f} s ({rate:.2f} items/s)", file=sys.stderr)
+    if writer.tokens and elapsed:
+        print(f"[batch] {writer.tokens} tokens generated, {writer.tokens / elapsed:.1f} tokens/s, "
+              f"{elapsed * 1000 / count:.0f} ms/item", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
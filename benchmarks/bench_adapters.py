@@ -0,0 +1,292 @@
+# benchmarks/bench_adapters.py
+"""Offline adapter benchmarks: cold load, first call, warm p50/p95, batch throughput, peak RSS.
+
+Each adapter runs in its own subprocess so cold-start and peak-RSS numbers are not
+polluted by the others. By default the adapters point at tiny random checkpoints
+built locally (see tiny_models.py); --real uses the real weights from the local
+Hugging Face cache only (never the network) and skips adapters that aren't cached.
+
+    python -m benchmarks.bench_adapters                      # all adapters, tiny models
+    python -m benchmarks.bench_adapters --real --iters 10
+    python -m benchmarks.bench_adapters --compare bench_results/old.json
+    python -m benchmarks.bench_adapters --models text-to-image --verify-profile bf16
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+TINY_DIR = os.path.join(ROOT, ".cache", "tiny_models")
+RESULTS_DIR = os.path.join(ROOT, "bench_results")
+
+TEXTS = [
+    "This movie was great, I really loved it.",
+    "The car was red and the street was very quiet.",
+    "A terrible film, not good at all.",
+    "I hate waiting, but the dog was good.",
+]
+
+# Metrics where a bigger number is worse (throughput is compared the other way round)
+LOWER_IS_BETTER = ("load_s", "first_call_ms", "p50_ms", "p95_ms", "peak_rss_mb")
+
+
+# ---------------- Inputs ---------------- #
+def make_images(folder, count=8, size=(1024, 768)):
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"sample_{i}.jpg")
+        if not os.path.exists(path):
+            Image.effect_noise(size, 40 + i).convert("RGB").save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def make_payloads(adapter, workdir, real, sd_steps):
+    if adapter.input_kind == "image":
+        return make_images(os.path.join(workdir, "images"))
+    if adapter.category == "Text-to-Image":
+        size = 384 if real else 64
+        return [{"prompt": t, "steps": sd_steps, "width": size, "height": size, "seed": i}
+                for i, t in enumerate(TEXTS)]
+    return list(TEXTS)
+
+
+# ---------------- Single adapter (runs in a subprocess) ---------------- #
+def bench_one(name, iters, batch_sizes, real, sd_steps, backend=None, verify_profile=None):
+    t_start = time.perf_counter()
+    from app_model.registry import build_models
+    from helpers import images, image_writer
+
+    models = build_models()
+    adapter = models[name]
+
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    if adapter.category == "Text-to-Image":
+        # Keep generated files out of the real assets/ and its gallery index; a profile
+        # check is timed on its own below rather than inside load_s
+        adapter.configure(output_dir=os.path.join(workdir, "out"), index_assets=False, preview_every=0,
+                          verify_steps=0)
+        if verify_profile:
+            adapter.configure(cpu_profile=verify_profile)
+
+    if real:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+        os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    else:
+        # Built beforehand by a --prepare process; here this only reads the marker
+        from benchmarks.tiny_models import ensure_tiny_model
+        adapter.configure(model_name=ensure_tiny_model(name, TINY_DIR))
+    if backend and hasattr(adapter, "backend"):
+        adapter.configure(backend=backend)
+
+    # Heavy imports are timed separately from load()
+    t0 = time.perf_counter()
+    models.prefetch(name).join()
+    import_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    adapter.load()
+    load_s = time.perf_counter() - t0
+
+    profile_check = None
+    if verify_profile and adapter.category == "Text-to-Image":
+        profile_check = adapter.verify_profile(steps=sd_steps)
+
+    payloads = make_payloads(adapter, workdir, real, sd_steps)
+
+    def timed_run(payload):
+        images.clear_cache()  # measure decode too, as a new file would
+        t = time.perf_counter()
+        adapter.run(payload)
+        return (time.perf_counter() - t) * 1000
+
+    first_call_ms = timed_run(payloads[0])
+    warm = [timed_run(payloads[i % len(payloads)]) for i in range(iters)]
+
+    throughput = {}
+    for bs in batch_sizes:
+        batch = [payloads[i % len(payloads)] for i in range(bs)]
+        adapter.run_batch(batch)  # warm this batch shape
+        images.clear_cache()
+        t = time.perf_counter()
+        rounds = max(1, iters // bs)
+        for _ in range(rounds):
+            images.clear_cache()
+            adapter.run_batch(batch)
+        throughput[str(bs)] = bs * rounds / (time.perf_counter() - t)
+
+    image_writer.wait_all()
+    warm.sort()
+    return {
+        "model": adapter.model_name if real else f"tiny:{os.path.basename(adapter.model_name)}",
+        "backend": getattr(adapter, "active_backend", None),
+        "import_s": import_s,
+        "load_s": load_s,
+        "first_call_ms": first_call_ms,
+        "p50_ms": statistics.median(warm),
+        "p95_ms": warm[min(len(warm) - 1, int(round(0.95 * (len(warm) - 1))))],
+        "throughput": throughput,
+        "peak_rss_mb": _peak_rss_mb(),
+        "profile_check": profile_check,
+        "wall_s": time.perf_counter() - t_start,
+    }
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB elsewhere
+
+
+# ---------------- Driver ---------------- #
+def run_isolated(name, args):
+    if not args.real:
+        # Building the tiny model imports torch; keep that out of the measured process
+        prep = subprocess.run([sys.executable, "-m", "benchmarks.bench_adapters", "--prepare", name],
+                              cwd=ROOT, capture_output=True, text=True)
+        if prep.returncode != 0:
+            err = (prep.stderr.strip().splitlines() or ["unknown error"])[-1]
+            return {"error": f"building tiny model: {err}"}
+    cmd = [sys.executable, "-m", "benchmarks.bench_adapters", "--single", name,
+           "--iters", str(args.iters), "--batch-sizes", args.batch_sizes, "--sd-steps", str(args.sd_steps)]
+    if args.real:
+        cmd.append("--real")
+    if args.backend:
+        cmd += ["--backend", args.backend]
+    if args.verify_profile:
+        cmd += ["--verify-profile", args.verify_profile]
+    proc = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        err = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return {"error": err}
+    return json.loads(lines[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment():
+    env = {"python": platform.python_version(), "machine": platform.machine(),
+           "processor": platform.processor(), "cpus": os.cpu_count()}
+    for mod in ("torch", "transformers", "diffusers"):
+        try:
+            env[mod] = __import__(mod).__version__
+        except Exception:
+            env[mod] = None
+    return env
+
+
+def compare(current, baseline, tolerance):
+    """Print metric deltas against a previous results file; returns the regressions."""
+    regressions = []
+    for name, cur in current["adapters"].items():
+        base = baseline.get("adapters", {}).get(name)
+        if not base or "error" in cur or "error" in base:
+            continue
+        for key in LOWER_IS_BETTER:
+            if base.get(key):
+                delta = cur[key] / base[key] - 1
+                print(f"  {name:<22}{key:<16}{base[key]:>10.2f} -> {cur[key]:>10.2f}  {delta:+.1%}")
+                if delta > tolerance:
+                    regressions.append((name, key, delta))
+        for bs, value in cur.get("throughput", {}).items():
+            old = base.get("throughput", {}).get(bs)
+            if old:
+                delta = value / old - 1
+                print(f"  {name:<22}{'items/s @' + bs:<16}{old:>10.2f} -> {value:>10.2f}  {delta:+.1%}")
+                if -delta > tolerance:
+                    regressions.append((name, f"throughput@{bs}", delta))
+    return regressions
+
+
+def parse_args(argv=None):
+    from app_model.registry import MODEL_SPECS, model_slug
+    from app_model.compiled import BACKENDS
+    from app_model.text_to_image import CPU_PROFILES
+
+    ap = argparse.ArgumentParser(description="Benchmark the model adapters offline.")
+    ap.add_argument("--models", nargs="*", choices=[model_slug(n) for n in MODEL_SPECS],
+                    help="subset of adapters (default: all)")
+    ap.add_argument("--real", action="store_true", help="use cached real weights instead of tiny models")
+    ap.add_argument("--iters", type=int, default=20, help="warm iterations per adapter")
+    ap.add_argument("--batch-sizes", default="1,4,8")
+    ap.add_argument("--sd-steps", type=int, default=4, help="denoising steps for text-to-image")
+    ap.add_argument("--out", help="results JSON (default: bench_results/<time>_<commit>.json)")
+    ap.add_argument("--compare", help="previous results JSON to diff against")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before failing --compare")
+    ap.add_argument("--backend", choices=BACKENDS, help="execution backend for the classifiers (default: eager)")
+    ap.add_argument("--verify-profile", choices=list(CPU_PROFILES),
+                    help="run text-to-image with this CPU profile and compare its output with float32")
+    ap.add_argument("--single", help=argparse.SUPPRESS)
+    ap.add_argument("--prepare", help=argparse.SUPPRESS)
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",") if b]
+
+    if args.prepare:
+        from benchmarks.tiny_models import ensure_tiny_model
+        ensure_tiny_model(args.prepare, TINY_DIR)
+        return 0
+
+    if args.single:
+        print(json.dumps(bench_one(args.single, args.iters, batch_sizes, args.real, args.sd_steps, args.backend,
+                                    args.verify_profile)))
+        return 0
+
+    from app_model.registry import MODEL_SPECS, model_slug
+    names = [n for n in MODEL_SPECS if not args.models or model_slug(n) in args.models]
+
+    results = {"commit": git_commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "weights": "real" if args.real else "tiny", "env": environment(), "adapters": {}}
+    for name in names:
+        print(f"[bench] {name} ...", file=sys.stderr)
+        res = results["adapters"][name] = run_isolated(name, args)
+        if "error" in res:
+            print(f"[bench]   skipped: {res['error']}", file=sys.stderr)
+        else:
+            tput = ", ".join(f"bs{b}: {v:.1f}/s" for b, v in res["throughput"].items())
+            print(f"[bench]   load {res['load_s']:.2f} s, first {res['first_call_ms']:.1f} ms, "
+                  f"p50 {res['p50_ms']:.1f} ms, p95 {res['p95_ms']:.1f} ms, {tput}, "
+                  f"peak RSS {res['peak_rss_mb']:.0f} MB", file=sys.stderr)
+            check = res.get("profile_check")
+            if check:
+                print(f"[bench]   profile {check['profile']}: similarity {check['similarity']:.3f} "
+                      f"({'passed' if check['passed'] else 'FAILED'}), {check['step_ms']:.0f} ms/step "
+                      f"vs {check['baseline_step_ms']:.0f} float32", file=sys.stderr)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{results['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[bench] wrote {out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            for name, key, delta in regressions:
+                print(f"[bench] REGRESSION {name} {key} {delta:+.1%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# benchmarks/eval_quantization.py
+"""Compare int8 (dynamic quantization) against fp32 for the transformer adapters.
+
+Runs the same local samples through each adapter at both precisions and reports
+label agreement (classifiers), caption similarity (BLIP), weight footprint and
+mean latency. Offline: real weights come from the local Hugging Face cache.
+
+    python -m benchmarks.eval_quantization --images samples/ --texts texts.jsonl
+    python -m benchmarks.eval_quantization --tiny       # smoke test on the tiny models
+"""
+import argparse
+import difflib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_adapters import TEXTS, TINY_DIR, make_images
+from helpers.images import iter_images
+
+ADAPTERS = ("Text Classification", "Image Classification", "Image-to-Text")
+
+
+def load_texts(path):
+    if not path:
+        return list(TEXTS)
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+            return [r.get("prompt") or r.get("text") if isinstance(r, dict) else str(r) for r in rows]
+        return [line.strip() for line in f if line.strip()]
+
+
+def list_images(folder, limit):
+    return [path for _, path in iter_images(folder)][:limit]
+
+
+def run_all(adapter, payloads):
+    outs, times = [], []
+    for payload in payloads:
+        t0 = time.perf_counter()
+        out = adapter.run(payload)
+        times.append((time.perf_counter() - t0) * 1000)
+        outs.append(out["result"])
+    return outs, statistics.mean(times) if times else 0.0
+
+
+def label(result):
+    # "POSITIVE (0.98)" -> "POSITIVE"
+    return result.rsplit(" (", 1)[0]
+
+
+def caption(result):
+    return result.split(":", 1)[-1].strip().lower()
+
+
+def evaluate(name, payloads, tiny):
+    from app_model.registry import build_models
+
+    runs = {}
+    for precision in ("fp32", "int8"):
+        adapter = build_models()[name].configure(precision=precision)
+        if tiny:
+            from benchmarks.tiny_models import ensure_tiny_model
+            adapter.configure(model_name=ensure_tiny_model(name, TINY_DIR))
+        adapter.load()
+        adapter.run(payloads[0])  # warm-up, not timed
+        outs, ms = run_all(adapter, payloads)
+        runs[precision] = {"outputs": outs, "mean_ms": ms, "weights_mb": adapter.param_bytes() / 2**20}
+        adapter.unload()
+
+    ref, test = runs["fp32"]["outputs"], runs["int8"]["outputs"]
+    if name == "Image-to-Text":
+        scores = [difflib.SequenceMatcher(None, caption(a).split(), caption(b).split()).ratio()
+                  for a, b in zip(ref, test)]
+        quality = {"caption_similarity": statistics.mean(scores),
+                   "exact_captions": sum(caption(a) == caption(b) for a, b in zip(ref, test)) / len(ref)}
+    else:
+        quality = {"label_agreement": sum(label(a) == label(b) for a, b in zip(ref, test)) / len(ref)}
+
+    return {
+        "samples": len(payloads),
+        **quality,
+        "fp32_ms": runs["fp32"]["mean_ms"],
+        "int8_ms": runs["int8"]["mean_ms"],
+        "speedup": runs["fp32"]["mean_ms"] / runs["int8"]["mean_ms"] if runs["int8"]["mean_ms"] else None,
+        "fp32_weights_mb": runs["fp32"]["weights_mb"],
+        "int8_weights_mb": runs["int8"]["weights_mb"],
+        "disagreements": [{"fp32": a, "int8": b} for a, b in zip(ref, test) if a != b][:10],
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="int8 vs fp32 agreement, latency and footprint.")
+    ap.add_argument("--images", help="directory of sample images (default: synthetic noise images)")
+    ap.add_argument("--texts", help="sample sentences: .jsonl or one per line (default: built-in)")
+    ap.add_argument("--limit", type=int, default=50, help="max samples per adapter")
+    ap.add_argument("--tiny", action="store_true", help="use the tiny local models instead of cached weights")
+    ap.add_argument("--out", help="write the report as JSON")
+    args = ap.parse_args(argv)
+
+    if not args.tiny:
+        os.environ["HF_HUB_OFFLINE"] = "1"
+    images = list_images(args.images, args.limit) if args.images else make_images(tempfile.mkdtemp(prefix="evalq_"))
+    texts = load_texts(args.texts)[:args.limit]
+
+    report = {}
+    for name in ADAPTERS:
+        payloads = texts if name == "Text Classification" else images
+        print(f"[evalq] {name}: {len(payloads)} samples ...", file=sys.stderr)
+        try:
+            res = report[name] = evaluate(name, payloads, args.tiny)
+        except Exception as ex:
+            report[name] = {"error": f"{type(ex).__name__}: {ex}"}
+            print(f"[evalq]   skipped: {report[name]['error']}", file=sys.stderr)
+            continue
+        quality = (f"caption similarity {res['caption_similarity']:.3f}" if "caption_similarity" in res
+                   else f"label agreement {res['label_agreement']:.1%}")
+        print(f"[evalq]   {quality}, {res['fp32_ms']:.1f} -> {res['int8_ms']:.1f} ms, "
+              f"{res['fp32_weights_mb']:.0f} -> {res['int8_weights_mb']:.0f} MB", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# benchmarks/tiny_models.py
+"""Randomly initialised, architecture-faithful tiny checkpoints for every adapter.
+
+Everything is built locally with save_pretrained(), so the benchmarks run on
+air-gapped machines. The numbers measure framework and pipeline overhead plus a
+scaled-down forward pass, not model quality.
+"""
+import json
+import os
+
+SPECIAL = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]
+WORDS = (
+    "the a an is was it this that movie film great good bad awful terrible love hate "
+    "red blue green car dog cat photo of on in with and but not very really street"
+).split()
+
+
+def _bert_vocab(path):
+    letters = [chr(c) for c in range(ord("a"), ord("z") + 1)]
+    tokens = SPECIAL + WORDS + letters + ["##" + c for c in letters] + list(".,!?'")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(tokens) + "\n")
+    return len(tokens)
+
+
+def build_text_classifier(root):
+    from transformers import DistilBertConfig, DistilBertForSequenceClassification, DistilBertTokenizerFast
+
+    out = os.path.join(root, "tiny-distilbert")
+    os.makedirs(out, exist_ok=True)
+    vocab_size = _bert_vocab(os.path.join(out, "vocab.txt"))
+    DistilBertTokenizerFast(vocab_file=os.path.join(out, "vocab.txt")).save_pretrained(out)
+    config = DistilBertConfig(
+        vocab_size=vocab_size, dim=32, n_layers=2, n_heads=2, hidden_dim=64,
+        max_position_embeddings=512,
+        id2label={0: "NEGATIVE", 1: "POSITIVE"}, label2id={"NEGATIVE": 0, "POSITIVE": 1},
+    )
+    DistilBertForSequenceClassification(config).save_pretrained(out)
+    return out
+
+
+def build_image_classifier(root):
+    from transformers import ViTConfig, ViTForImageClassification, ViTImageProcessor
+
+    out = os.path.join(root, "tiny-vit")
+    labels = {i: f"class_{i}" for i in range(10)}
+    config = ViTConfig(
+        image_size=224, patch_size=16, hidden_size=32, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=64,
+        id2label=labels, label2id={v: k for k, v in labels.items()},
+    )
+    ViTForImageClassification(config).save_pretrained(out)
+    ViTImageProcessor(size={"height": 224, "width": 224}).save_pretrained(out)
+    return out
+
+
+def build_captioner(root):
+    from transformers import (BertTokenizerFast, BlipConfig, BlipForConditionalGeneration,
+                              BlipImageProcessor, BlipProcessor)
+
+    out = os.path.join(root, "tiny-blip")
+    os.makedirs(out, exist_ok=True)
+    vocab_path = os.path.join(out, "vocab.txt")
+    vocab_size = _bert_vocab(vocab_path)
+    tokenizer = BertTokenizerFast(vocab_file=vocab_path)
+    BlipProcessor(BlipImageProcessor(size={"height": 384, "width": 384}), tokenizer).save_pretrained(out)
+
+    cls_id, sep_id = SPECIAL.index("[CLS]"), SPECIAL.index("[SEP]")
+    config = BlipConfig(
+        text_config={
+            "vocab_size": vocab_size, "hidden_size": 32, "num_hidden_layers": 2,
+            "num_attention_heads": 2, "intermediate_size": 64, "encoder_hidden_size": 32,
+            "bos_token_id": cls_id, "sep_token_id": sep_id, "eos_token_id": sep_id, "pad_token_id": 0,
+        },
+        vision_config={
+            "hidden_size": 32, "num_hidden_layers": 2, "num_attention_heads": 2,
+            "intermediate_size": 64, "image_size": 384, "patch_size": 32,
+        },
+        projection_dim=32,
+    )
+    BlipForConditionalGeneration(config).save_pretrained(out)
+    return out
+
+
+def _clip_tokenizer_files(out):
+    # Character-level BPE vocab: enough for CLIPTokenizer to run, no merges needed
+    chars = [chr(c) for c in range(33, 127)]
+    vocab = {"<|startoftext|>": 0, "<|endoftext|>": 1}
+    for c in chars:
+        vocab.setdefault(c, len(vocab))
+        vocab.setdefault(c + "</w>", len(vocab))
+    with open(os.path.join(out, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(out, "merges.txt"), "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+    return len(vocab)
+
+
+def build_text_to_image(root):
+    from diffusers import AutoencoderKL, DDIMScheduler, StableDiffusionPipeline, UNet2DConditionModel
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+    out = os.path.join(root, "tiny-sd")
+    tok_dir = os.path.join(root, "tiny-clip-tokenizer")
+    os.makedirs(tok_dir, exist_ok=True)
+    vocab_size = _clip_tokenizer_files(tok_dir)
+    tokenizer = CLIPTokenizer(os.path.join(tok_dir, "vocab.json"), os.path.join(tok_dir, "merges.txt"),
+                              pad_token="<|endoftext|>")
+
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=vocab_size, hidden_size=32, intermediate_size=64, num_attention_heads=4,
+        num_hidden_layers=2, projection_dim=32, max_position_embeddings=77,
+        bos_token_id=0, eos_token_id=1, pad_token_id=1,
+    ))
+    unet = UNet2DConditionModel(
+        sample_size=32, in_channels=4, out_channels=4, layers_per_block=1,
+        block_out_channels=(32, 64),
+        down_block_types=("CrossAttnDownBlock2D", "DownBlock2D"),
+        up_block_types=("UpBlock2D", "CrossAttnUpBlock2D"),
+        cross_attention_dim=32, attention_head_dim=8,
+    )
+    vae = AutoencoderKL(
+        in_channels=3, out_channels=3, latent_channels=4, block_out_channels=(32, 64),
+        down_block_types=("DownEncoderBlock2D", "DownEncoderBlock2D"),
+        up_block_types=("UpDecoderBlock2D", "UpDecoderBlock2D"),
+    )
+    pipe = StableDiffusionPipeline(
+        vae=vae, text_encoder=text_encoder, tokenizer=tokenizer, unet=unet,
+        scheduler=DDIMScheduler(), safety_checker=None, feature_extractor=None,
+        requires_safety_checker=False,
+    )
+    pipe.save_pretrained(out, safe_serialization=True)
+    return out
+
+
+# registry name -> builder
+BUILDERS = {
+    "Text Classification": build_text_classifier,
+    "Image Classification": build_image_classifier,
+    "Image-to-Text": build_captioner,
+    "Text-to-Image": build_text_to_image,
+}
+
+
+def ensure_tiny_model(name, root):
+    """Build the tiny checkpoint for `name` under `root` once; returns its directory."""
+    marker = os.path.join(root, f".{BUILDERS[name].__name__}.done")
+    if os.path.exists(marker):
+        with open(marker, encoding="utf-8") as f:
+            return f.read().strip()
+    import torch
+    torch.manual_seed(0)  # identical weights on every machine
+    path = BUILDERS[name](root)
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(path)
+    return path
@@ -0,0 +1,205 @@
+# helpers/asset_store.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+ASSETS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "assets"))
+THUMB_SIZE = (256, 256)
+
+# generated_<snippet>_<YYYYmmdd_HHMMSS>_<w>x<h>_s<steps>.<ext>, as written by TextToImageAdapter
+_NAME_RE = re.compile(r"^generated_(?P<snippet>.*)_(?P<ts>\d{8}_\d{6})_(?P<w>\d+)x(?P<h>\d+)_s(?P<steps>\d+)\.\w+$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    id       INTEGER PRIMARY KEY,
+    path     TEXT UNIQUE NOT NULL,
+    prompt   TEXT NOT NULL DEFAULT '',
+    seed     INTEGER,
+    steps    INTEGER,
+    width    INTEGER,
+    height   INTEGER,
+    model    TEXT,
+    total_ms REAL,
+    step_ms  REAL,
+    created  REAL NOT NULL,
+    thumb    TEXT
+);
+CREATE INDEX IF NOT EXISTS assets_created ON assets(created);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS assets_fts USING fts5(prompt, content='assets', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS assets_ai AFTER INSERT ON assets BEGIN
+    INSERT INTO assets_fts(rowid, prompt) VALUES (new.id, new.prompt);
+END;
+CREATE TRIGGER IF NOT EXISTS assets_ad AFTER DELETE ON assets BEGIN
+    INSERT INTO assets_fts(assets_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+END;
+"""
+
+
+class AssetStore:
+    """SQLite index of generated images plus a thumbnail cache, so nothing has to scan assets/."""
+
+    def __init__(self, root=ASSETS_DIR):
+        self.root = root
+        self.thumb_dir = os.path.join(root, ".thumbs")
+        os.makedirs(self.thumb_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(_SCHEMA)
+        try:
+            self._db.executescript(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False  # SQLite built without FTS5; fall back to LIKE
+        self._db.commit()
+
+    # ---------------- Writing ---------------- #
+    def add(self, path, image=None, **meta):
+        """Index `path` and write its thumbnail (from `image` if given, else from disk)."""
+        path = os.path.abspath(path)
+        thumb = self._write_thumb(path, image)
+        row = {
+            "path": path,
+            "prompt": meta.get("prompt", ""),
+            "seed": meta.get("seed"),
+            "steps": meta.get("steps"),
+            "width": meta.get("width"),
+            "height": meta.get("height"),
+            "model": meta.get("model"),
+            "total_ms": meta.get("total_ms"),
+            "step_ms": meta.get("step_ms"),
+            "created": meta.get("created") or time.time(),
+            "thumb": thumb,
+        }
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        with self._lock:
+            self._db.execute(f"INSERT OR IGNORE INTO assets ({cols}) VALUES ({marks})", list(row.values()))
+            self._db.commit()
+
+    def record_async(self, save_future, path, image, **meta):
+        """Index `path` once its background write (an image_writer Future) has succeeded."""
+        def done(fut):
+            if fut.exception() is None:
+                try:
+                    self.add(path, image, **meta)
+                except Exception:
+                    pass  # the image itself is safe on disk; indexing is best effort
+        save_future.add_done_callback(done)
+
+    def reindex(self, progress=None, batch=500):
+        """Scan assets/ for files the index doesn't know yet; returns how many were added.
+
+        Rows go in `batch` at a time, one transaction each, and progress(added) is
+        called after every batch. Thumbnails are left to ensure_thumb(), so no
+        original is decoded here. Safe to run off the UI thread.
+        """
+        with self._lock:
+            known = {r[0] for r in self._db.execute("SELECT path FROM assets")}
+        added, rows = 0, []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                m = _NAME_RE.match(entry.name)
+                if not m or not entry.is_file() or os.path.abspath(entry.path) in known:
+                    continue
+                rows.append((os.path.abspath(entry.path), m["snippet"].replace("_", " "),
+                             int(m["steps"]), int(m["w"]), int(m["h"]),
+                             time.mktime(time.strptime(m["ts"], "%Y%m%d_%H%M%S"))))
+                if len(rows) >= batch:
+                    added += self._insert_many(rows)
+                    rows = []
+                    if progress:
+                        progress(added)
+        if rows:
+            added += self._insert_many(rows)
+            if progress:
+                progress(added)
+        return added
+
+    def _insert_many(self, rows):
+        with self._lock, self._db:  # one transaction for the whole batch
+            self._db.executemany(
+                "INSERT OR IGNORE INTO assets (path, prompt, steps, width, height, created) VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+        return len(rows)
+
+    def _thumb_path(self, path):
+        # Named after the path relative to assets/, so same-named files in subfolders don't collide
+        rel = os.path.relpath(path, self.root)
+        stem = os.path.splitext(os.path.basename(path))[0][:48]
+        return os.path.join(self.thumb_dir, f"{stem}-{hashlib.sha1(rel.encode()).hexdigest()[:12]}.jpg")
+
+    def _write_thumb(self, path, image=None):
+        from PIL import Image
+        from helpers import image_writer
+
+        thumb = self._thumb_path(path)
+        if os.path.exists(thumb):
+            return thumb
+        try:
+            if image is None:
+                from helpers.images import load_image
+                image = load_image(path, THUMB_SIZE)
+            small = image.copy()
+            small.thumbnail(THUMB_SIZE, Image.BILINEAR)
+            image_writer.write_atomic(small, thumb, "jpeg", quality=85)
+        except Exception:
+            return None
+        return thumb
+
+    # ---------------- Reading ---------------- #
+    def search(self, text="", limit=60, offset=0):
+        """Newest-first rows, optionally filtered by prompt text."""
+        text = (text or "").strip()
+        with self._lock:
+            if not text:
+                cur = self._db.execute(
+                    "SELECT * FROM assets ORDER BY created DESC LIMIT ? OFFSET ?", (limit, offset))
+            elif self.has_fts:
+                # Every word must match, as a prefix
+                query = " ".join('"' + w.replace('"', '""') + '"*' for w in text.split())
+                cur = self._db.execute(
+                    "SELECT a.* FROM assets_fts f JOIN assets a ON a.id = f.rowid "
+                    "WHERE assets_fts MATCH ? ORDER BY a.created DESC LIMIT ? OFFSET ?",
+                    (query, limit, offset))
+            else:
+                cur = self._db.execute(
+                    "SELECT * FROM assets WHERE prompt LIKE ? ORDER BY created DESC LIMIT ? OFFSET ?",
+                    (f"%{text}%", limit, offset))
+            return [dict(r) for r in cur.fetchall()]
+
+    def ensure_thumb(self, row):
+        """Thumbnail path for a row, creating it from the original if it is missing."""
+        thumb = row.get("thumb")
+        if thumb and os.path.exists(thumb):
+            return thumb
+        thumb = self._write_thumb(row["path"])
+        if thumb:
+            with self._lock:
+                self._db.execute("UPDATE assets SET thumb = ? WHERE id = ?", (thumb, row["id"]))
+                self._db.commit()
+        return thumb
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store for the project's assets/ directory."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = AssetStore()
+        return _store
@@ -0,0 +1,84 @@
+# helpers/batching.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects single run() requests and sends them to adapter.run_batch() together.
+
+    A batch is flushed once it holds `max_batch` items or `max_wait_ms` has passed
+    since its first item arrived, whichever comes first. `run_batch` replaces
+    adapter.run_batch, e.g. to put a result cache in front of it.
+    """
+
+    def __init__(self, adapter, max_batch=None, max_wait_ms=20, run_batch=None):
+        self.adapter = adapter
+        self.max_batch = max(1, int(max_batch or adapter.max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self._run_batch = run_batch or adapter.run_batch
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload):
+        """Queue one payload; returns a Future resolving to its result dict."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        fut = Future()
+        self._queue.put((payload, fut))
+        return fut
+
+    def run(self, payload, timeout=None):
+        # Blocking drop-in for adapter.run()
+        return self.submit(payload).result(timeout)
+
+    def close(self, wait=True):
+        self._closed = True
+        self._queue.put(_STOP)
+        if wait:
+            self._thread.join()
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        # Drop requests whose caller already gave up
+        batch = [(p, f) for p, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            outs = list(self._run_batch([p for p, _ in batch]))
+            if len(outs) != len(batch):
+                # zip() would leave the extra futures waiting forever
+                raise RuntimeError(f"run_batch returned {len(outs)} results for {len(batch)} inputs")
+        except Exception as ex:
+            for _, fut in batch:
+                fut.set_exception(ex)
+            return
+        for (_, fut), out in zip(batch, outs):
+            fut.set_result(out)
@@ -0,0 +1,46 @@
+# helpers/cancel.py
+import threading
+import time
+
+
+class Cancelled(Exception):
+    """Raised inside a worker when its CancelToken has been triggered."""
+
+
+class TimedOut(Cancelled):
+    """Raised when a CancelToken's wall-clock deadline has passed."""
+
+
+class CancelToken:
+    """Thread-safe flag that a UI thread sets and a worker polls.
+
+    With `timeout` (seconds) the token also trips by itself once the deadline passes.
+    """
+
+    def __init__(self, timeout=None):
+        self._event = threading.Event()
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def timed_out(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or self.timed_out
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled("Cancelled")
+        if self.timed_out:
+            raise TimedOut(f"Timed out after {self.timeout:g} s")
+
+
+def check(cancel):
+    # Convenience for optional tokens
+    if cancel is not None:
+        cancel.check()
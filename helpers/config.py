@@ -1,11 +1,39 @@
 # utils/config.py
-import json, os
+import atexit, copy, json, os, threading, time
 
 _CFG_PATH = os.path.join(os.path.dirname(__file__), "..", "app_config.json")
 _CFG_PATH = os.path.abspath(_CFG_PATH)
 
 _DEFAULTS = {
     "theme": "Light",   # Light | Dark | Blue | Custom
+    "memory_budget_mb": 0,   # resident model budget; 0 = half of physical RAM
+    "process_mode": "inline",   # inline | worker (models in a separate process)
+    # Per-model overrides of adapter class settings, keyed by registry name
+    "model_options": {
+        # preview_every: live preview interval in steps (0 = off)
+        # cpu_profile: baseline | tuned | bf16 (see app_model/text_to_image.py)
+        # output_format: png | webp | jpeg, with png_compress_level / jpeg_quality
+        # precision: fp32 | int8 for Text Classification, Image Classification, Image-to-Text
+        # backend: eager | torchscript | compile for Text Classification, Image Classification
+        # Image-to-Text: decoding greedy | beam | sample, num_beams, temperature, top_k, top_p,
+        #   min_new_tokens / max_new_tokens, use_cache
+        # Text Classification: long_documents, window_tokens, stride (sliding-window scoring)
+        # Image Classification: top_k, regions single | tiles | multicrop (tile_size, max_grid, crop_fraction)
+        "Text-to-Image": {"preview_every": 5, "cpu_profile": "baseline",
+                          "output_format": "png", "png_compress_level": 1, "jpeg_quality": 92},
+    },
+    # Preload the most used models in the background at launch (see app_model/warm_start.py)
+    "warm_start": {"enabled": True, "max_models": 2, "min_uses": 3, "half_life_days": 14,
+                   "min_available_mb": 1024},
+    # Written by the app: runs per model, last use and measured memory cost
+    "model_usage": {},
+    "result_cache": {"enabled": True, "memory_items": 256, "disk": False, "disk_mb": 256},
+    # Per-stage latency histograms, exported to .cache/metrics (JSON + Prometheus text)
+    "tracing": {"enabled": True, "export_every_s": 60},
+    # server.py: bind address, executor threads, per-model queue / in-flight limits
+    "server": {"host": "127.0.0.1", "port": 8765, "workers": 8, "max_queue": 32,
+               "batch_wait_ms": 10, "max_body_mb": 32, "max_steps": 100, "max_side": 1024,
+               "max_guidance": 30, "concurrency": {"Text-to-Image": 1}},
     "custom": {
         "bg": "#ffffff",
         "fg": "#111111",
@@ -20,16 +48,89 @@ _DEFAULTS = {
 }
 
 def load_config():
+    # Always a fresh copy: callers edit nested sections in place (see update_config())
     try:
         with open(_CFG_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return {**_DEFAULTS, **data, "custom": {**_DEFAULTS["custom"], **data.get("custom", {})}}
+            return _merge(_DEFAULTS, json.load(f))
     except Exception:
-        return _DEFAULTS.copy()
+        return copy.deepcopy(_DEFAULTS)
+
+def _merge(defaults, data):
+    """Deep copy of `defaults` with `data` laid over it, dict sections merged key by key."""
+    out = copy.deepcopy(defaults)
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(out.get(key), dict):
+            out[key] = _merge(out[key], value)
+        else:
+            out[key] = copy.deepcopy(value)
+    return out
 
 def save_config(cfg):
+    # Temp file + rename: a reader never sees a half-written file, nor does a crash leave one
+    tmp = f"{_CFG_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
     try:
-        with open(_CFG_PATH, "w", encoding="utf-8") as f:
+        with open(tmp, "w", encoding="utf-8") as f:
             json.dump(cfg, f, indent=2)
+        os.replace(tmp, _CFG_PATH)
     except Exception:
-        pass
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+_update_lock = threading.RLock()  # one load/modify/save at a time, from any thread
+
+
+def update_config(fn):
+    """Load the config, let `fn` edit it in place, and save it; returns the saved config.
+
+    Every read-modify-write of app_config.json goes through here so that the UI
+    and the background usage flush cannot overwrite each other's changes.
+    """
+    with _update_lock:
+        cfg = load_config()
+        fn(cfg)
+        save_config(cfg)
+        return cfg
+
+
+_usage_lock = threading.Lock()
+_usage_pending = {}   # name -> {"count", "last_used", "cost_mb"} not yet written
+
+
+def record_usage(name, cost_bytes=0):
+    """Count one run of `name` (with its time and resident memory cost); kept in memory.
+
+    flush_usage() merges the counts into app_config.json; it also runs at exit.
+    """
+    with _usage_lock:
+        if not _usage_pending:
+            atexit.register(flush_usage)  # unregistered again by the flush
+        entry = _usage_pending.setdefault(name, {"count": 0})
+        entry["count"] += 1
+        entry["last_used"] = int(time.time())
+        if cost_bytes:
+            entry["cost_mb"] = round(cost_bytes / (1024 * 1024))
+
+
+def flush_usage():
+    """Write counts recorded since the last flush to "model_usage"; no-op if there are none."""
+    with _usage_lock:
+        pending = dict(_usage_pending)
+        _usage_pending.clear()
+        atexit.unregister(flush_usage)
+    if not pending:
+        return
+    update_config(lambda cfg: _merge_usage(cfg, pending))
+
+
+def _merge_usage(cfg, pending):
+    usage = {name: dict(entry) for name, entry in (cfg.get("model_usage") or {}).items()}
+    for name, new in pending.items():
+        entry = usage.setdefault(name, {})
+        entry["count"] = entry.get("count", 0) + new["count"]
+        entry["last_used"] = max(entry.get("last_used", 0), new["last_used"])
+        if "cost_mb" in new:
+            entry["cost_mb"] = new["cost_mb"]
+    cfg["model_usage"] = usage
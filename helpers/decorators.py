@@ -1,20 +1,39 @@
+import logging
 import time
 from functools import wraps
 
+from helpers import tracing
+
 def log_action(func):
+    log = logging.getLogger(func.__module__)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        print(f"[LOG] {func.__name__} called")
+        # Debug level: silent (and nearly free) unless logging is configured for it
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("%s called", func.__qualname__)
         return func(*args, **kwargs)
     return wrapper
 
 def timeit(func):
+    """Time an adapter call into its tracing histogram and set `_ms` on the result(s).
+
+    The call's name ("run", "run_batch") is the stage; stage spans opened inside are
+    attributed to the same adapter.
+    """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        t0 = time.time()
-        out = func(*args, **kwargs)
-        ms = (time.time() - t0) * 1000
+        adapter = getattr(args[0], "category", None) if args else None
+        t0 = time.perf_counter_ns()
+        with tracing.adapter_call(adapter or func.__qualname__, func.__name__):
+            out = func(*args, **kwargs)
+        ms = (time.perf_counter_ns() - t0) / 1e6
         if isinstance(out, dict):
             out["_ms"] = ms
+        elif isinstance(out, list):
+            # Batched call: every item waited for the whole batch
+            for item in out:
+                if isinstance(item, dict):
+                    item["_ms"] = ms
         return out
     return wrapper
@@ -0,0 +1,93 @@
+# helpers/image_writer.py
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers import tracing
+
+# format name -> (file extension, PIL format)
+FORMATS = {
+    "png": (".png", "PNG"),
+    "webp": (".webp", "WEBP"),   # always lossless here
+    "jpeg": (".jpg", "JPEG"),
+}
+
+_pool = None
+_pending = {}   # path -> Future, until the file is on disk
+_lock = threading.Lock()
+_tmp_ids = itertools.count()
+
+
+def extension(fmt):
+    return FORMATS.get(fmt, FORMATS["png"])[0]
+
+
+def save_options(fmt, png_level=1, jpeg_quality=92):
+    """PIL save() kwargs for an output format."""
+    if fmt == "webp":
+        return {"lossless": True, "method": 4}
+    if fmt == "jpeg":
+        return {"quality": int(jpeg_quality), "optimize": False}
+    return {"compress_level": int(png_level)}
+
+
+def write_atomic(image, path, fmt="png", fsync=False, **options):
+    """Encode to a temp file next to `path`, then rename it into place."""
+    pil_format = FORMATS.get(fmt, FORMATS["png"])[1]
+    # A unique temp file per write: concurrent saves to one path must not share it.
+    # (Not mkstemp: its 0600 mode would carry over to the published image.)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.{next(_tmp_ids)}.tmp"
+    try:
+        with open(tmp, "xb") as f:
+            image.save(f, format=pil_format, **options)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def save_async(image, path, fmt="png", **options):
+    """Queue an atomic write on the background I/O pool; returns a Future of `path`."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-io")
+        # The encode is traced as the "save" stage of whichever adapter queued it
+        fut = _pool.submit(_traced_write, tracing.current(), image, path, fmt, options)
+        _pending[os.path.abspath(path)] = fut
+    fut.add_done_callback(lambda f, key=os.path.abspath(path): _forget(key, f))
+    return fut
+
+
+def _traced_write(adapter, image, path, fmt, options):
+    with tracing.span("save", adapter):
+        return write_atomic(image, path, fmt, **options)
+
+
+def wait(path, timeout=None):
+    """Block until a queued write of `path` (if any) has finished."""
+    with _lock:
+        fut = _pending.get(os.path.abspath(path))
+    if fut is not None:
+        fut.result(timeout)
+
+
+def wait_all(timeout=None):
+    with _lock:
+        futures = list(_pending.values())
+    for fut in futures:
+        fut.result(timeout)
+
+
+def _forget(key, fut):
+    with _lock:
+        if _pending.get(key) is fut:
+            del _pending[key]
@@ -0,0 +1,115 @@
+# helpers/images.py
+import os
+import threading
+from collections import OrderedDict
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+_MAX_BYTES = 256 * 1024 * 1024   # decoded pixels kept around, across all callers
+
+_cache = OrderedDict()   # (path, mtime_ns, size) -> RGB image
+_cache_bytes = 0
+_lock = threading.Lock()
+
+
+def load_image(path, size=None):
+    """Decode `path` to RGB once and share it between adapters and the preview.
+
+    With `size` (w, h) the result is only guaranteed to be at least that large:
+    JPEGs use PIL's draft mode to decode straight at a reduced scale, and other
+    formats are box-reduced by an integer factor. Callers resize to their exact
+    input size as before. Returned images are shared - treat them as read-only.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, mtime, tuple(size) if size else None)
+
+    with _lock:
+        img = _cache.get(key)
+        if img is not None:
+            _cache.move_to_end(key)
+            return img
+        # A larger decode of the same file is cheaper to shrink than re-decoding
+        source = _find_larger(path, mtime, size)
+
+    img = _shrink(source, size) if source is not None else _decode(path, size)
+    _put(key, img)
+    return img
+
+
+def warmup_image(size):
+    """Path of a synthetic (w, h) PNG for warm-up runs, written once under .cache/warmup."""
+    from PIL import Image
+
+    folder = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "warmup"))
+    path = os.path.join(folder, f"{size[0]}x{size[1]}.png")
+    if not os.path.exists(path):
+        os.makedirs(folder, exist_ok=True)
+        # A gradient rather than a flat colour, so nothing takes a degenerate fast path
+        img = Image.linear_gradient("L").resize(tuple(size)).convert("RGB")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        img.save(tmp, format="PNG")
+        os.replace(tmp, path)
+    return path
+
+
+def iter_images(root):
+    """Yield (relative path, absolute path) for every image under root, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTS):
+                full = os.path.join(dirpath, name)
+                yield os.path.relpath(full, root), full
+
+
+def clear_cache():
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def _decode(path, size):
+    from PIL import Image
+
+    img = Image.open(path)
+    if size and img.format == "JPEG":
+        img.draft("RGB", size)   # DCT scaling: 1/2, 1/4 or 1/8 while still >= size
+    img = img.convert("RGB")
+    return _shrink(img, size)
+
+
+def _shrink(img, size):
+    # Integer box reduction that keeps both sides >= the requested size
+    if not size:
+        return img
+    factor = int(min(img.width / size[0], img.height / size[1]))
+    return img.reduce(factor) if factor >= 2 else img
+
+
+def _find_larger(path, mtime, size):
+    best = None
+    for (p, m, s), img in _cache.items():
+        if p != path or m != mtime:
+            continue
+        if s is None or not size:
+            if s is None:
+                return img   # the full-resolution decode serves any request
+            continue
+        if s[0] >= size[0] and s[1] >= size[1]:
+            if best is None or img.width * img.height < best.width * best.height:
+                best = img
+    return best
+
+
+def _put(key, img):
+    global _cache_bytes
+    nbytes = img.width * img.height * 3
+    with _lock:
+        if key in _cache:
+            return
+        _cache[key] = img
+        _cache_bytes += nbytes
+        while _cache_bytes > _MAX_BYTES and len(_cache) > 1:
+            _, old = _cache.popitem(last=False)
+            _cache_bytes -= old.width * old.height * 3
@@ -0,0 +1,66 @@
+# helpers/memory.py
+import ctypes
+import gc
+import os
+import sys
+
+
+def current_rss():
+    """Resident set size of this process in bytes (0 if it can't be measured)."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+def total_memory():
+    """Physical memory in bytes (0 if unknown)."""
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except Exception:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except Exception:
+        return 0
+
+
+def available_memory():
+    """Memory the system can hand out without swapping, in bytes (0 if unknown)."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except Exception:
+        pass
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    return 0
+
+
+def release_memory():
+    """Collect garbage and hand freed heap pages back to the OS where possible."""
+    gc.collect()
+    torch = sys.modules.get("torch")  # never import torch just to free memory
+    if torch is not None:
+        try:
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except Exception:
+            pass
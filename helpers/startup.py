@@ -0,0 +1,27 @@
+# helpers/startup.py
+import time
+
+# Import this module first so the clock starts as close to process start as possible
+_T0 = time.perf_counter()
+_marks = []
+
+
+def mark(label):
+    """Record a startup milestone (time since the previous mark)."""
+    now = time.perf_counter()
+    prev = _marks[-1][2] if _marks else _T0
+    _marks.append((label, (now - prev) * 1000, now))
+
+
+def total_ms():
+    return ((_marks[-1][2] if _marks else time.perf_counter()) - _T0) * 1000
+
+
+def report(extra=None):
+    """Human-readable breakdown; `extra` maps names to seconds (e.g. background imports)."""
+    lines = [f"Startup: {total_ms():.0f} ms to first frame"]
+    lines += [f"  {label:<28}{ms:8.1f} ms" for label, ms, _ in _marks]
+    if extra:
+        lines.append("Background imports:")
+        lines += [f"  {name:<28}{sec * 1000:8.1f} ms" for name, sec in extra.items()]
+    return "\n".join(lines)
@@ -0,0 +1,246 @@
+# helpers/tracing.py
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bucket bounds in ms (roughly x2.5 apart); one extra overflow bucket
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 180000, 600000)
+
+METRICS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".cache", "metrics"))
+DEFAULTS = {"enabled": True, "export_every_s": 60}
+# Stages the adapters report: decode, preprocess, forward, generate, denoise,
+# postprocess and save, plus the whole call as "run" / "run_batch"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: O(log buckets) to record, constant memory."""
+
+    __slots__ = ("counts", "count", "sum_ns", "max_ns")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        self.counts[bisect_left(BUCKETS_MS, ns / 1e6)] += 1
+        self.count += 1
+        self.sum_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th sample (ms), never above the max."""
+        if not self.count:
+            return 0.0
+        max_ms = self.max_ns / 1e6
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(float(bound), max_ms)
+        return max_ms
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.sum_ns / self.count / 1e6 if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": self.max_ns / 1e6,
+            "buckets_ms": list(BUCKETS_MS),
+            "counts": list(self.counts),
+        }
+
+
+_hist = {}                  # (adapter, stage) -> Histogram
+_lock = threading.Lock()
+_sources = []               # callables returning drain() output of another process
+_local = threading.local()  # .adapter: name of the adapter call running on this thread
+enabled = True
+
+
+def current():
+    """Adapter whose call is running on this thread (None outside of one)."""
+    return getattr(_local, "adapter", None)
+
+
+def record(adapter, stage, ns):
+    if not enabled or getattr(_local, "suppressed", False):
+        return
+    key = (adapter or "other", stage)
+    with _lock:
+        hist = _hist.get(key)
+        if hist is None:
+            hist = _hist[key] = Histogram()
+        hist.record(ns)
+
+
+@contextmanager
+def span(stage, adapter=None):
+    """Time a block into the (adapter, stage) histogram; adapter defaults to the current call's."""
+    adapter = adapter or current()
+    t0 = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(adapter, stage, time.perf_counter_ns() - t0)
+
+
+@contextmanager
+def suppressed():
+    """Record nothing on this thread inside the block (warm-up runs aren't real latency)."""
+    outer = getattr(_local, "suppressed", False)
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = outer
+
+
+@contextmanager
+def adapter_call(adapter, stage):
+    """Outermost span of an adapter call; spans opened inside it are attributed to `adapter`."""
+    outer = current()
+    _local.adapter = adapter
+    t0 = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(adapter, stage, time.perf_counter_ns() - t0)
+        _local.adapter = outer
+
+
+def drain():
+    """Raw histograms recorded so far, as picklable tuples, and reset them; see merge()."""
+    with _lock:
+        items = [(key, h.counts, h.count, h.sum_ns, h.max_ns) for key, h in _hist.items()]
+        _hist.clear()
+    return items
+
+
+def merge(items):
+    """Add histograms from drain() (e.g. of the model worker process) to this process's."""
+    if not enabled:
+        return
+    with _lock:
+        for key, counts, count, sum_ns, max_ns in items:
+            key = tuple(key)
+            hist = _hist.get(key)
+            if hist is None:
+                hist = _hist[key] = Histogram()
+            hist.counts = [a + b for a, b in zip(hist.counts, counts)]
+            hist.count += count
+            hist.sum_ns += sum_ns
+            hist.max_ns = max(hist.max_ns, max_ns)
+
+
+def add_source(fn):
+    """Pull fn() into the local histograms before every snapshot or export."""
+    _sources.append(fn)
+
+
+def remove_source(fn):
+    if fn in _sources:
+        _sources.remove(fn)
+
+
+def _pull():
+    for fn in list(_sources):
+        try:
+            merge(fn())
+        except Exception:
+            pass  # e.g. the worker is restarting; its data arrives next time
+
+
+def snapshot():
+    """{adapter: {stage: histogram summary}}"""
+    _pull()
+    with _lock:
+        items = [(key, hist.to_dict()) for key, hist in _hist.items()]
+    out = {}
+    for (adapter, stage), data in sorted(items):
+        out.setdefault(adapter, {})[stage] = data
+    return out
+
+
+def reset():
+    with _lock:
+        _hist.clear()
+
+
+# ---------------- Export ---------------- #
+def to_prometheus():
+    """Prometheus text exposition format (cumulative buckets, seconds)."""
+    name = "adapter_stage_latency_seconds"
+    lines = [f"# HELP {name} Time spent per adapter and stage.", f"# TYPE {name} histogram"]
+    _pull()
+    with _lock:
+        items = sorted((key, list(h.counts), h.count, h.sum_ns) for key, h in _hist.items())
+    for (adapter, stage), counts, count, sum_ns in items:
+        labels = f'adapter="{_escape(adapter)}",stage="{_escape(stage)}"'
+        cumulative = 0
+        for bound, n in zip(BUCKETS_MS, counts):
+            cumulative += n
+            lines.append(f'{name}_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"{name}_sum{{{labels}}} {sum_ns / 1e9:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def export(directory):
+    """Write metrics.json and metrics.prom into `directory` (atomically, safe to scrape)."""
+    os.makedirs(directory, exist_ok=True)
+    data = {"time": time.time(), "adapters": snapshot()}
+    _write(os.path.join(directory, "metrics.json"), json.dumps(data, indent=2))
+    _write(os.path.join(directory, "metrics.prom"), to_prometheus())
+
+
+def from_config(cfg, directory=METRICS_DIR):
+    """Apply the "tracing" section of app_config.json; returns the export directory or None."""
+    global enabled
+    opts = {**DEFAULTS, **(cfg.get("tracing") or {})}
+    enabled = bool(opts["enabled"])
+    if not enabled:
+        return None
+    start_exporter(directory, opts["export_every_s"])
+    return directory
+
+
+def start_exporter(directory, interval_s=60):
+    """Export every `interval_s` seconds on a daemon thread, and once more on exit."""
+    import atexit
+
+    def loop():
+        while True:
+            time.sleep(interval_s)
+            _safe_export(directory)
+
+    if interval_s > 0:
+        threading.Thread(target=loop, daemon=True, name="metrics-export").start()
+    atexit.register(_safe_export, directory)
+
+
+def _safe_export(directory):
+    try:
+        if _hist or _sources:
+            export(directory)
+    except OSError:
+        pass  # metrics are best effort
+
+
+def _write(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
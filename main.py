@@ -1,20 +1,38 @@
+from helpers import startup  # first, so it times everything below
+import os
+import logging
 import tkinter as tk
 from tkinter import ttk, messagebox
 import threading
 import time
+import queue
 from itertools import cycle
 
 from helpers.theme import apply_theme
+from helpers.config import load_config, update_config, record_usage, flush_usage
+from helpers.cancel import CancelToken, Cancelled, TimedOut
+from helpers.memory import release_memory
+from helpers.images import iter_images
+from helpers import tracing
 from userInterface.input_frame import InputFrame
 from userInterface.output_frame import OutputFrame
 from userInterface.info_frame import InfoFrame
 from userInterface.preferences import PreferencesDialog
+from userInterface.gallery import GalleryDialog
 
 # --- Model Adapters ---
-from app_model.text_sentiment import TextSentimentAdapter
-from app_model.image_classifier import ImageClassifierAdapter
-from app_model.image_to_text import ImageToTextAdapter
-from app_model.text_to_image import TextToImageAdapter
+from app_model.base import STAGE_LABELS
+from app_model.quantization import PRECISIONS
+from app_model.registry import build_models
+from app_model.residency import ResidencyManager
+from app_model.result_cache import ResultCache
+from app_model.warm_start import WarmStarter
+
+log = logging.getLogger(__name__)
+
+startup.mark("imports")
+
+USAGE_FLUSH_MS = 60_000  # how often model run counts are written to app_config.json
 
 
 class FloatingSpinner(ttk.Frame):
@@ -53,22 +71,32 @@ class AIApp(tk.Tk):
         self.geometry("1040x680")
         self.minsize(860, 560)
         apply_theme(self)
+        startup.mark("window + theme")
 
         self._is_running = False
         self._thread = None
+        self._run_token = None
         self._result = None
         self._error = None
         self._current_model = None
         self.spinner = None
 
-        # Model registry
-        self.models = {
-            "Text Classification": TextSentimentAdapter(),
-            "Image Classification": ImageClassifierAdapter(),
-            "Image-to-Text": ImageToTextAdapter(),
-            "Text-to-Image": TextToImageAdapter(),
-        }
-        self.selected_model = tk.StringVar(value="Text Classification")
+        # Background model loading (independent of runs)
+        self._loading = None
+        self._load_token = None
+
+        # Model registry (adapters are built and their libraries imported lazily)
+        cfg = load_config()
+        self.models = build_models(cfg.get("model_options"), cfg.get("process_mode", "inline"))
+        self.residency = ResidencyManager(self.models, cfg.get("memory_budget_mb", 0))
+        self.result_cache = ResultCache.from_config(cfg)
+        tracing.from_config(cfg)
+        # The most used models are preloaded once the window is up; start on the likeliest
+        self._warm_events = queue.Queue()
+        self.warm_start = WarmStarter(self.residency, cfg, busy=lambda: self._is_running,
+                                      on_event=lambda *event: self._warm_events.put(event))
+        self.selected_model = tk.StringVar(value=(self.warm_start.names or ["Text Classification"])[0])
+        self.selected_precision = tk.StringVar(value="fp32")
 
         # Layout
         self.columnconfigure(0, weight=1)
@@ -76,6 +104,9 @@ class AIApp(tk.Tk):
         self._create_menu()
         self._create_layout()
         self._bind_keys()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        startup.mark("layout")
+        self.after_idle(self._on_first_frame)
 
     # ---------------- Menu ---------------- #
     def _create_menu(self):
@@ -85,10 +116,18 @@ class AIApp(tk.Tk):
         file_menu = tk.Menu(menu_bar, tearoff=0)
         file_menu.add_command(label="Settings", command=lambda: PreferencesDialog(self), accelerator="Ctrl+,")
         file_menu.add_separator()
-        file_menu.add_command(label="Quit", command=self.destroy, accelerator="Ctrl+Q")
+        file_menu.add_command(label="Quit", command=self._on_close, accelerator="Ctrl+Q")
         menu_bar.add_cascade(label="File", menu=file_menu)
 
+        view_menu = tk.Menu(menu_bar, tearoff=0)
+        view_menu.add_command(label="Gallery", command=self.open_gallery, accelerator="Ctrl+G")
+        menu_bar.add_cascade(label="View", menu=view_menu)
+
         help_menu = tk.Menu(menu_bar, tearoff=0)
+        help_menu.add_command(
+            label="Startup Timing",
+            command=lambda: messagebox.showinfo("Startup Timing", startup.report(self.models.import_times)),
+        )
         help_menu.add_command(
             label="About",
             command=lambda: messagebox.showinfo(
@@ -114,9 +153,28 @@ class AIApp(tk.Tk):
         self.combo = ttk.Combobox(top, textvariable=self.selected_model,
                                   values=list(self.models.keys()), state="readonly", width=26)
         self.combo.grid(row=0, column=1, padx=6, sticky="w")
+        self.combo.bind("<<ComboboxSelected>>", lambda e: self._on_model_selected())
+
+        # Weight precision for adapters that support int8 quantization
+        prec = ttk.Frame(top)
+        prec.grid(row=0, column=2, padx=(6, 0), sticky="w")
+        ttk.Label(prec, text="Precision:").pack(side="left")
+        self.precision_combo = ttk.Combobox(prec, textvariable=self.selected_precision,
+                                            values=list(PRECISIONS), state="readonly", width=6)
+        self.precision_combo.pack(side="left", padx=6)
+        self.precision_combo.bind("<<ComboboxSelected>>", lambda e: self.set_precision())
+        self._sync_precision()
 
         ttk.Button(top, text="Load", command=self.load_model, style="Accent.TButton").grid(row=0, column=3, sticky="w")
 
+        # Load progress (shown only while a model loads)
+        self.load_bar = ttk.Progressbar(top, length=160, maximum=100, style="Horizontal.TProgressbar")
+        self.load_bar.grid(row=0, column=4, padx=(10, 4), sticky="w")
+        self.load_cancel_btn = ttk.Button(top, text="Cancel Load", command=self.cancel_load)
+        self.load_cancel_btn.grid(row=0, column=5, sticky="w")
+        self.load_bar.grid_remove()
+        self.load_cancel_btn.grid_remove()
+
         # Middle panes
         panes = ttk.Panedwindow(self, orient="horizontal")
         panes.grid(row=1, column=0, sticky="nsew", padx=12, pady=6)
@@ -146,15 +204,64 @@ class AIApp(tk.Tk):
     def _bind_keys(self):
         self.bind_all("<Control-r>", lambda e: self.run_model())
         self.bind_all("<Control-l>", lambda e: self.load_model())
-        self.bind_all("<Control-q>", lambda e: self.destroy())
+        self.bind_all("<Control-q>", lambda e: self._on_close())
         self.bind_all("<Escape>", lambda e: self.cancel_run())
         self.bind_all("<Control-comma>", lambda e: PreferencesDialog(self))
+        self.bind_all("<Control-g>", lambda e: self.open_gallery())
+
+    # ---------------- Gallery ---------------- #
+    def open_gallery(self):
+        def show(row):
+            seed = f", seed {row['seed']}" if row.get("seed") is not None else ""
+            self.output_panel.show({"result": f"{row['prompt']}{seed}", "image_path": row["path"]})
+        GalleryDialog(self, on_open=show)
+
+    # ---------------- Startup ---------------- #
+    def _on_first_frame(self):
+        startup.mark("first frame")
+        log.debug("%s", startup.report())  # the full breakdown is under Help > Startup Timing
+        self._set_status(f"Ready in {startup.total_ms():.0f} ms")
+        # Warm the imports for the default selection while the user looks around
+        self.models.prefetch(self.selected_model.get())
+        if self.warm_start.names:
+            self.warm_start.start()
+            self.after(200, self._poll_warm_start)
+        self.after(USAGE_FLUSH_MS, self._flush_usage)
+
+    def _flush_usage(self):
+        # Run counts are kept in memory; the file write happens off the Tk thread
+        threading.Thread(target=flush_usage, daemon=True).start()
+        self.after(USAGE_FLUSH_MS, self._flush_usage)
+
+    def _on_close(self):
+        self.warm_start.cancel()
+        if self._run_token:
+            self._run_token.cancel()
+        flush_usage()
+        self.models.close()
+        self.destroy()
+
+    def _poll_warm_start(self):
+        while True:
+            try:
+                kind, name, detail = self._warm_events.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_running or self._loading:
+                continue  # don't overwrite their status
+            if kind == "loaded":
+                self._set_status(self._with_stats(f"Warm start: {name} ready in {detail:.1f} s"))
+            else:
+                self._set_status(f"Warm start: {name} {kind} ({detail})")
+        if not (self.warm_start.done and self._warm_events.empty()):
+            self.after(200, self._poll_warm_start)
 
     # ---------------- Busy State ---------------- #
     def _set_busy(self, busy: bool, text=""):
         self._is_running = busy
         state = "disabled" if busy else "normal"
         self.combo.configure(state=state if not busy else "disabled")
+        self._sync_precision(busy)
         self.run_btn.configure(state=state)
         if busy:
             self.spinner = FloatingSpinner(self, text=text)
@@ -166,65 +273,195 @@ class AIApp(tk.Tk):
             self._set_status(text)
 
     # ---------------- Model Handling ---------------- #
-    def load_model(self):
-        if self._is_running:
+    def _on_model_selected(self):
+        self.models.prefetch(self.selected_model.get())
+        self._sync_precision()
+
+    def _sync_precision(self, busy=False):
+        # Adapter instances are cheap (no weights); only some support int8
+        adapter = self.models[self.selected_model.get()]
+        supported = hasattr(adapter, "precision")
+        self.selected_precision.set(adapter.precision if supported else "fp32")
+        self.precision_combo.configure(state="readonly" if supported and not busy else "disabled")
+
+    def set_precision(self):
+        name = self.selected_model.get()
+        adapter = self.models[name]
+        value = self.selected_precision.get()
+        if getattr(adapter, "precision", value) == value:
+            return
+        was_loaded = adapter.is_loaded()
+        # Refused while the model runs or loads: its weights stay at the old precision
+        if name == self._loading or not self.residency.reconfigure(name, precision=value):
+            self.selected_precision.set(adapter.precision)
+            self._set_status(f"{name} is busy; change its precision once it finishes")
             return
+        update_config(lambda cfg: cfg.setdefault("model_options", {}).setdefault(name, {}).update(precision=value))
+        if was_loaded:
+            self._set_status(self._with_stats(f"{name} unloaded; it reloads as {value} on the next run"))
+        else:
+            self._set_status(f"{name} will load as {value}")
+
+    def load_model(self):
         model_name = self.selected_model.get()
-        if self._current_model and self._current_model != model_name:
-            ok = messagebox.askyesno("Confirm", f"Replace '{self._current_model}' with '{model_name}'?")
-            if not ok:
+        if self._loading:
+            self._set_status(f"Still loading {self._loading}...")
+            return
+
+        # Loading runs on a worker; the UI polls a queue for stage updates
+        events = queue.Queue()
+        token = self._load_token = CancelToken()
+
+        def progress(stage, index, total):
+            events.put(("stage", stage, index, total))
+
+        def worker():
+            try:
+                adapter = self.residency.ensure_loaded(model_name, progress=progress, cancel=token)
+                events.put(("done", adapter))
+            except Cancelled:
+                events.put(("cancelled", None))
+            except Exception as ex:
+                events.put(("error", ex))
+
+        self._loading = model_name
+        self.load_bar.configure(value=0)
+        self.load_bar.grid()
+        self.load_cancel_btn.configure(state="normal")
+        self.load_cancel_btn.grid()
+        self._set_status(f"Loading {model_name}...")
+        threading.Thread(target=worker, daemon=True).start()
+        self.after(100, self._poll_load, model_name, events)
+
+    def _poll_load(self, model_name, events):
+        while True:
+            try:
+                kind, *data = events.get_nowait()
+            except queue.Empty:
+                self.after(100, self._poll_load, model_name, events)
                 return
 
-        try:
-            self._set_busy(True, f"Loading {model_name}...")
-            self.update_idletasks()
-            self.models[model_name].load()
-            self.info_panel.set_info(self.models[model_name].info())
-            self._set_status(f"{model_name} loaded")
-            messagebox.showinfo("Success", f"{model_name} loaded successfully")
-            self._current_model = model_name
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-            self._set_status("Failed to load model")
-        finally:
-            self._set_busy(False)
+            if kind == "stage":
+                stage, index, total = data
+                self.load_bar.configure(value=100 * index / total)
+                if not self._load_token.cancelled:
+                    self._set_status(f"Loading {model_name}: {STAGE_LABELS[stage]} ({index + 1}/{total})")
+                continue
+
+            self._loading = None
+            self.load_bar.grid_remove()
+            self.load_cancel_btn.grid_remove()
+            if kind == "done":
+                adapter = data[0]
+                self.info_panel.set_info(adapter.info())
+                self._set_status(self._with_stats(f"{model_name} loaded"))
+                messagebox.showinfo("Success", f"{model_name} loaded successfully")
+                self._current_model = model_name
+            elif kind == "cancelled":
+                self._set_status(f"Loading {model_name} cancelled")
+            else:
+                messagebox.showerror("Error", str(data[0]))
+                self._set_status("Failed to load model")
+            return
+
+    def cancel_load(self):
+        if self._loading and self._load_token:
+            self._load_token.cancel()
+            self.load_cancel_btn.configure(state="disabled")
+            self._set_status(f"Cancelling load of {self._loading}...")
 
     def run_model(self):
         if self._is_running:
             return
         name = self.selected_model.get()
+        if name == self._loading:
+            self._set_status(f"{name} is still loading...")
+            return
         adapter = self.models[name]
-        if getattr(adapter, "_pipe", None) is None and not hasattr(adapter, "_model"):
+        # Evicted models come back on demand; only a never-loaded model needs the Load button
+        if not adapter.is_loaded() and not self.residency.was_loaded(name):
+            if self.warm_start.pending(name):
+                self._set_status(f"{name} is still loading (warm start)...")
+                return
             messagebox.showwarning("Warning", f"Load '{name}' before running.")
             return
 
         payload = self.input_panel.get_payload()
         task_input = payload.get("prompt") if payload.get("mode") == "text" else payload.get("image_path") or payload.get("prompt")
 
+        # A folder of images goes through run_batch(), max_batch_size images per call
+        folder = None
+        if adapter.input_kind == "image" and task_input and os.path.isdir(task_input):
+            folder = list(iter_images(task_input))
+            if not folder:
+                messagebox.showwarning("Warning", f"No images in '{task_input}'.")
+                return
+        batches = -(-len(folder) // adapter.max_batch_size) if folder else 1
+
         self._result, self._error = None, None
+        token = self._run_token = CancelToken(timeout=adapter.timeout_s * batches)
+
+        # Step progress / live previews (text-to-image) come back through a queue
+        events = queue.Queue()
+        run_kwargs = {}
+        if getattr(adapter, "streams_previews", False):
+            run_kwargs["progress"] = lambda step, total, preview: events.put((step, total, preview))
 
         def worker():
             try:
-                t0 = time.time()
-                res = adapter.run(task_input)
+                t0 = time.perf_counter()
+                if folder:
+                    res = self._run_folder(name, adapter, folder, token, events)
+                else:
+                    with self.residency.use(name):
+                        res = self.result_cache.run(adapter, task_input, cancel=token, **run_kwargs)
                 if not isinstance(res, dict):
                     res = {"result": str(res)}
-                res.setdefault("_time_ms", (time.time() - t0) * 1000)
+                # Adapters time themselves (@timeit); this only covers any that don't
+                res.setdefault("_ms", (time.perf_counter() - t0) * 1000)
                 self._result = res
+            except Cancelled as ex:
+                self._error = ex
+                release_memory()  # drop the aborted run's activations right away
             except Exception as ex:
                 self._error = ex
 
         self._set_busy(True, f"Running {name}...")
         self._thread = threading.Thread(target=worker, daemon=True)
         self._thread.start()
-        self.after(100, self._check_thread, name, adapter)
-
-    def _check_thread(self, name, adapter):
+        self.after(100, self._check_thread, name, adapter, events)
+
+    def _run_folder(self, name, adapter, items, token, events):
+        """Run (relative path, path) items in batches; one result line per image."""
+        t0 = time.perf_counter()
+        lines, tokens = [], 0
+        for start in range(0, len(items), adapter.max_batch_size):
+            chunk = items[start:start + adapter.max_batch_size]
+            with self.residency.use(name):
+                outs = self.result_cache.run_batch(adapter, [path for _, path in chunk], cancel=token)
+            for (rel, _), out in zip(chunk, outs):
+                lines.append(f"{rel}: {out.get('result', '')}")
+                tokens += out.get("_gen", {}).get("tokens", 0)
+            events.put((start + len(chunk), len(items), None))
+
+        elapsed = time.perf_counter() - t0
+        res = {"result": "\n".join(lines), "_ms": elapsed * 1000}
+        if tokens:
+            res["_gen"] = {"tokens": tokens, "tokens_per_s": round(tokens / elapsed, 1),
+                           "ms_per_image": round(elapsed * 1000 / len(items), 1), "batch": len(items)}
+        return res
+
+    def _check_thread(self, name, adapter, events):
+        self._drain_progress(name, events)
         if self._thread and self._thread.is_alive():
-            self.after(100, self._check_thread, name, adapter)
+            self.after(100, self._check_thread, name, adapter, events)
             return
 
         self._set_busy(False)
+        if isinstance(self._error, Cancelled):
+            self.output_panel.show({"result": str(self._error)})
+            self._set_status(f"{name} timed out" if isinstance(self._error, TimedOut) else f"{name} cancelled")
+            return
         if self._error:
             self.output_panel.show({"result": f"Error: {self._error}"})
             self._set_status("Run failed")
@@ -232,17 +469,47 @@ class AIApp(tk.Tk):
 
         output = self._result or {}
         self.output_panel.show(output)
+        record_usage(name, self.residency.known_cost(name))  # ranks models for the next warm start
         try:
             self.info_panel.set_info(adapter.info())
         except Exception:
             pass
-        ms = output.get("_time_ms")
-        self._set_status(f"Finished {name} in {ms:.1f} ms" if ms else f"Finished {name}")
+        ms = output.get("_ms")
+        msg = f"Finished {name} in {ms:.1f} ms" if ms else f"Finished {name}"
+        if output.get("_cached"):
+            msg += " (cached)"
+        gen = output.get("_gen")
+        if gen and gen.get("tokens_per_s"):
+            msg += f" ({gen['tokens_per_s']:.1f} tokens/s, {gen['ms_per_image']:.0f} ms/image)"
+        self._set_status(self._with_stats(msg))
+
+    def _drain_progress(self, name, events):
+        # Only the newest step and preview matter; older ones are skipped
+        step = preview = None
+        while True:
+            try:
+                step, total, img = events.get_nowait()
+            except queue.Empty:
+                break
+            preview = img or preview
+        if preview is not None:
+            self.output_panel.show_preview(preview)
+        if step is not None and not self._run_token.cancelled:
+            self._set_status(f"Running {name}: step {step}/{total}")
 
     def cancel_run(self):
         if self._is_running:
-            self._set_busy(False, "Cancelled")
-            self._thread = None
+            # The worker stops at its next check; the UI stays busy until it has exited
+            if self._run_token and not self._run_token.cancelled:
+                self._run_token.cancel()
+                self._set_status("Cancelling...")
+        elif self._loading:
+            self.cancel_load()
+
+    def _with_stats(self, msg):
+        if self.residency.evicted:
+            msg += f" (unloaded {', '.join(self.residency.evicted)})"
+        return f"{msg} | {self.residency.summary()} | {self.result_cache.summary()}"
 
     def _set_status(self, msg: str):
         self.status_bar.config(text=msg)
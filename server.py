@@ -0,0 +1,523 @@
+# server.py
+"""Local inference server: one warm set of models shared by every client on the machine.
+
+Examples:
+    python server.py                                  # http://127.0.0.1:8765
+    python server.py --socket /tmp/ai-demo.sock --preload image-to-text
+    curl -F image=@cat.jpg http://127.0.0.1:8765/v1/image-classification
+    curl -d '{"prompt": "great film"}' http://127.0.0.1:8765/v1/text-classification
+    curl -N -d '{"prompt": "a red car", "steps": 20}' 'http://127.0.0.1:8765/v1/text-to-image?stream=1'
+
+Endpoints: POST /v1/<model>, GET /v1/models, GET /health, GET /metrics (Prometheus text).
+"""
+import argparse
+import asyncio
+import email.policy
+import json
+import math
+import os
+import signal
+import stat
+import sys
+import tempfile
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import BytesParser
+
+from helpers.batching import MicroBatcher
+from helpers.cancel import CancelToken, Cancelled, TimedOut
+from helpers.config import load_config
+from helpers import image_writer, tracing
+from app_model.registry import build_models, model_slug
+from app_model.residency import ResidencyManager
+from app_model.result_cache import ResultCache
+
+DEFAULTS = {
+    "host": "127.0.0.1",
+    "port": 8765,
+    "workers": 8,           # executor threads for loads and unbatched runs
+    "max_queue": 32,        # requests per model waiting for a slot before 503
+    "batch_wait_ms": 10,    # how long a batched model waits to fill a batch
+    "max_body_mb": 32,
+    "max_steps": 100,       # text-to-image requests above these limits get a 400
+    "max_side": 1024,       # pixels, width and height
+    "max_guidance": 30,     # guidance_scale range is 0..max_guidance
+    "concurrency": {},      # name -> in-flight limit; default max_batch_size, 1 for text-to-image
+}
+
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 431: "Request Header Fields Too Large",
+           499: "Client Closed Request", 500: "Internal Server Error", 503: "Service Unavailable",
+           504: "Gateway Timeout"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Request:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self):
+        return self.headers.get("connection", "").lower() != "close"
+
+
+class ModelSlot:
+    """Per-model admission control: an in-flight limit plus a bounded wait queue."""
+
+    def __init__(self, name, limit, max_queue):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.sem = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.in_flight = 0
+        self.batcher = None
+        self.rejected = 0
+        self.statuses = {}  # HTTP status -> count
+
+    async def __aenter__(self):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HttpError(503, f"{self.name} is busy; {self.waiting} requests queued", {"Retry-After": "1"})
+        self.waiting += 1
+        try:
+            await self.sem.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self.sem.release()
+
+
+class InferenceServer:
+    def __init__(self, cfg, opts):
+        self.opts = opts
+        self.models = build_models(cfg.get("model_options"), cfg.get("process_mode", "inline"))
+        self.residency = ResidencyManager(self.models, cfg.get("memory_budget_mb", 0))
+        self.cache = ResultCache.from_config(cfg)
+        self.executor = ThreadPoolExecutor(max_workers=opts["workers"], thread_name_prefix="infer")
+        self.by_slug = {model_slug(name): name for name in self.models}
+        self.slots = {}
+        self.started = time.time()
+        self.max_body = int(opts["max_body_mb"] * 1024 * 1024)
+
+    def slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            adapter = self.models[name]
+            default = 1 if getattr(adapter, "streams_previews", False) else adapter.max_batch_size
+            limit = int(self.opts["concurrency"].get(name) or default)
+            slot = self.slots[name] = ModelSlot(name, limit, self.opts["max_queue"])
+        return slot
+
+    # ---------------- Connections ---------------- #
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    req = await self._read_request(reader, writer)
+                except HttpError as ex:
+                    await self._send_json(writer, ex.status, {"error": str(ex)}, ex.headers, keep_alive=False)
+                    break
+                if req is None:
+                    break
+                await self._dispatch(req, writer)
+                if not req.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None  # client closed between requests
+        except asyncio.LimitOverrunError:
+            raise HttpError(431, "headers too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "send a Content-Length")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "bad Content-Length")
+        if length > self.max_body:
+            raise HttpError(413, f"body over {self.opts['max_body_mb']} MB")
+        if length and headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        body = await reader.readexactly(length) if length else b""
+
+        url = urllib.parse.urlsplit(target)
+        return Request(method.upper(), url.path, dict(urllib.parse.parse_qsl(url.query)), headers, body)
+
+    async def _dispatch(self, req, writer):
+        try:
+            # Browsers send Origin; a page must not be able to drive the local models
+            if "origin" in req.headers:
+                raise HttpError(403, "cross-origin requests are not allowed")
+            if req.path == "/health":
+                await self._send_json(writer, 200, self.health(), keep_alive=req.keep_alive)
+            elif req.path == "/metrics":
+                await self._send(writer, 200, self.metrics().encode(), "text/plain; version=0.0.4",
+                                 keep_alive=req.keep_alive)
+            elif req.path == "/v1/models":
+                await self._send_json(writer, 200, self.health()["models"], keep_alive=req.keep_alive)
+            elif req.path.startswith("/v1/"):
+                await self._infer(req, writer)
+            else:
+                raise HttpError(404, f"no route for {req.path}")
+        except HttpError as ex:
+            await self._send_json(writer, ex.status, {"error": str(ex)}, ex.headers, keep_alive=req.keep_alive)
+
+    # ---------------- Inference ---------------- #
+    async def _infer(self, req, writer):
+        if req.method != "POST":
+            raise HttpError(405, "use POST")
+        name = self.by_slug.get(req.path[len("/v1/"):].strip("/"))
+        if name is None:
+            raise HttpError(404, f"unknown model; try one of {', '.join(self.by_slug)}")
+        adapter = self.models[name]
+        slot = self.slot(name)
+
+        payload, upload = self._parse_payload(req)
+        try:
+            # Image models read files: only ever the one uploaded with this request
+            if adapter.input_kind == "image" and upload is None:
+                raise HttpError(400, "send the image as a multipart/form-data file upload")
+            self._check_limits(payload)
+        except HttpError:
+            if upload:
+                os.remove(upload)
+            raise
+        stream = req.query.get("stream") in ("1", "true") and getattr(adapter, "streams_previews", False)
+        status = 500
+        try:
+            async with slot:
+                pin = self.residency.use(name)
+                await self._in_executor(pin.__enter__)  # may load (and evict others)
+                try:
+                    if stream:
+                        status = await self._run_streaming(adapter, payload, writer)
+                    else:
+                        out = _jsonable(await self._run(adapter, slot, payload))
+                        if upload:
+                            out.pop("image_path", None)  # temp file, gone after this request
+                        status = 200
+                        await self._send_json(writer, 200, out, keep_alive=req.keep_alive)
+                finally:
+                    pin.__exit__(None, None, None)
+        except HttpError as ex:
+            status = ex.status
+            raise
+        except ConnectionError:
+            status = 499
+            raise
+        except Exception as ex:
+            raise HttpError(500, f"{type(ex).__name__}: {ex}")
+        finally:
+            slot.statuses[status] = slot.statuses.get(status, 0) + 1
+            if upload:
+                os.remove(upload)
+
+    async def _run(self, adapter, slot, payload):
+        if getattr(adapter, "streams_previews", False):
+            token = CancelToken(timeout=adapter.timeout_s)
+            try:
+                return await self._in_executor(self.cache.run, adapter, payload, token)
+            except TimedOut as ex:
+                raise HttpError(504, str(ex))
+
+        # Batchable adapters: concurrent requests share one run_batch() call
+        if slot.batcher is None:
+            def run_batch(payloads):
+                # The batch's own deadline, from dispatch, stops a stuck batch
+                return self.cache.run_batch(adapter, payloads, cancel=CancelToken(timeout=adapter.timeout_s))
+            slot.batcher = MicroBatcher(adapter, max_wait_ms=self.opts["batch_wait_ms"], run_batch=run_batch)
+        future = slot.batcher.submit(payload)
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), adapter.timeout_s)
+        except asyncio.TimeoutError:
+            # Still queued: dropped before it runs. Already running: its batch finishes
+            # for the other requests in it, whose deadlines started later.
+            future.cancel()
+            raise HttpError(504, f"{adapter.category} timed out after {adapter.timeout_s} s")
+        except Cancelled as ex:
+            raise HttpError(504, str(ex))  # its batch hit the timeout
+
+    async def _run_streaming(self, adapter, payload, writer):
+        """Chunked NDJSON: one {"event": "step"} line per denoising step, then the result."""
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+        token = CancelToken(timeout=adapter.timeout_s)
+
+        def progress(step, total, preview):
+            loop.call_soon_threadsafe(events.put_nowait, {"event": "step", "step": step, "total": total})
+
+        job = loop.run_in_executor(self.executor, lambda: self.cache.run(adapter, payload, token, progress=progress))
+        job.add_done_callback(lambda f: events.put_nowait(None))
+
+        writer.write(_head(200, {"Content-Type": "application/x-ndjson", "Transfer-Encoding": "chunked",
+                                 "Cache-Control": "no-store"}))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                await self._write_chunk(writer, event)
+            try:
+                status, event = 200, {"event": "result", **_jsonable(job.result())}
+            except Cancelled as ex:
+                status, event = (504 if isinstance(ex, TimedOut) else 499), {"event": "error", "error": str(ex)}
+            except Exception as ex:
+                status, event = 500, {"event": "error", "error": f"{type(ex).__name__}: {ex}"}
+            await self._write_chunk(writer, event)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            token.cancel()  # client went away: stop denoising at the next step
+            await asyncio.wait([job])
+            raise
+        return status
+
+    def _in_executor(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _parse_payload(self, req):
+        """(payload dict, uploaded temp file or None) from JSON, form data or plain text."""
+        ctype = req.headers.get("content-type", "")
+        if ctype.startswith("multipart/form-data"):
+            return self._parse_multipart(ctype, req.body)
+        text = req.body.decode("utf-8", "replace")
+        if ctype.startswith("application/json") or text.lstrip().startswith("{"):
+            try:
+                data = json.loads(text)
+            except ValueError:
+                raise HttpError(400, "invalid JSON body")
+            if isinstance(data, dict) and "image_path" in data:
+                raise HttpError(400, "image_path is not accepted; upload the image as multipart/form-data")
+            return (data if isinstance(data, dict) else {"prompt": str(data)}), None
+        return {"prompt": text}, None
+
+    def _parse_multipart(self, ctype, body):
+        msg = BytesParser(policy=email.policy.HTTP).parsebytes(
+            b"Content-Type: " + ctype.encode("latin-1") + b"\r\n\r\n" + body)
+        if not msg.is_multipart():
+            raise HttpError(400, "malformed multipart body")
+        payload, upload = {}, None
+        for part in msg.iter_parts():
+            field = part.get_param("name", header="content-disposition")
+            data = part.get_payload(decode=True) or b""
+            if part.get_filename():
+                if upload:
+                    os.remove(upload)
+                # Adapters and the result cache work on files; the upload lives for this request only
+                suffix = os.path.splitext(part.get_filename())[1][:8] or ".img"
+                fd, upload = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                payload["image_path"] = upload
+            elif field == "image_path":
+                if upload:
+                    os.remove(upload)
+                raise HttpError(400, "image_path is not accepted; upload the image as a file")
+            elif field:
+                payload[field] = data.decode("utf-8", "replace")
+        return payload, upload
+
+    def _check_limits(self, payload):
+        """Coerce numeric fields and reject values that would tie up or break the pipeline."""
+        limits = {"steps": (1, self.opts["max_steps"]), "width": (64, self.opts["max_side"]),
+                  "height": (64, self.opts["max_side"]), "seed": (None, None)}
+        for key, (low, high) in limits.items():
+            if payload.get(key) in (None, ""):
+                continue
+            try:
+                payload[key] = value = int(payload[key])
+            except (TypeError, ValueError):
+                raise HttpError(400, f"{key} must be an integer")
+            if low is not None and not low <= value <= high:
+                raise HttpError(400, f"{key} must be between {low} and {high}")
+        if payload.get("guidance_scale") not in (None, ""):
+            try:
+                value = float(payload["guidance_scale"])
+            except (TypeError, ValueError):
+                raise HttpError(400, "guidance_scale must be a number")
+            high = self.opts["max_guidance"]
+            if not (math.isfinite(value) and 0 <= value <= high):  # NaN fails every comparison
+                raise HttpError(400, f"guidance_scale must be between 0 and {high}")
+            payload["guidance_scale"] = value
+
+    # ---------------- Health / metrics ---------------- #
+    def health(self):
+        models = {}
+        for name in self.models:
+            adapter = self.models.created().get(name)
+            slot = self.slots.get(name)
+            models[model_slug(name)] = {
+                "name": name,
+                "loaded": bool(adapter and adapter.is_loaded()),
+                "in_flight": slot.in_flight if slot else 0,
+                "queued": slot.waiting if slot else 0,
+            }
+        return {"status": "ok", "uptime_s": round(time.time() - self.started, 1),
+                "memory": self.residency.summary(), "cache": self.cache.summary(), "models": models}
+
+    def metrics(self):
+        slots = sorted(self.slots.items())
+
+        def per_model(value):
+            return [(f'model="{model_slug(name)}"', value(slot)) for name, slot in slots]
+
+        requests = [(f'model="{model_slug(name)}",status="{status}"', count)
+                    for name, slot in slots for status, count in sorted(slot.statuses.items())]
+        resident = [(f'model="{model_slug(name)}"', cost) for name, cost in self.residency.resident()]
+        # Each family as one group: its TYPE line, then all of its samples
+        families = [
+            ("server_requests_total", "counter", requests),
+            ("server_rejected_total", "counter", per_model(lambda slot: slot.rejected)),
+            ("server_in_flight", "gauge", per_model(lambda slot: slot.in_flight)),
+            ("server_queued", "gauge", per_model(lambda slot: slot.waiting)),
+            ("model_resident_bytes", "gauge", resident),
+            ("cache_hits_total", "counter", [("", self.cache.hits)]),
+            ("cache_misses_total", "counter", [("", self.cache.misses)]),
+        ]
+        lines = []
+        for family, kind, samples in families:
+            lines.append(f"# TYPE {family} {kind}")
+            lines += [f"{family}{{{labels}}} {value}" if labels else f"{family} {value}"
+                      for labels, value in samples]
+        return tracing.to_prometheus() + "\n".join(lines) + "\n"
+
+    # ---------------- Responses ---------------- #
+    async def _send(self, writer, status, body, ctype, headers=None, keep_alive=True):
+        head = {"Content-Type": ctype, "Content-Length": str(len(body)), **(headers or {})}
+        if not keep_alive:
+            head["Connection"] = "close"
+        writer.write(_head(status, head) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, data, headers=None, keep_alive=True):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, body, "application/json", headers, keep_alive)
+
+    @staticmethod
+    async def _write_chunk(writer, data):
+        line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+        writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+        await writer.drain()
+
+    def close(self):
+        for slot in self.slots.values():
+            if slot.batcher:
+                slot.batcher.close(wait=False)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        image_writer.wait_all(timeout=30)  # generated images are encoded in the background
+        self.models.close()  # in worker mode, waits for the worker's own image saves
+
+
+def _head(status, headers):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _jsonable(out):
+    # Drop in-memory extras such as the PIL image text-to-image returns
+    if not isinstance(out, dict):
+        return {"result": str(out)}
+    return {k: v for k, v in out.items() if v is None or isinstance(v, (str, int, float, bool, list, dict))}
+
+
+# ---------------- Entry point ---------------- #
+def parse_args(argv=None):
+    slugs = [model_slug(name) for name in build_models()]  # names only, nothing imported
+    ap = argparse.ArgumentParser(description="Serve the model adapters over HTTP on this machine.")
+    ap.add_argument("--host", help=f"bind address (default {DEFAULTS['host']})")
+    ap.add_argument("--port", type=int, help=f"TCP port (default {DEFAULTS['port']})")
+    ap.add_argument("--socket", help="listen on this Unix socket instead of TCP")
+    ap.add_argument("--preload", nargs="*", default=[], choices=slugs, help="models to load before serving")
+    return ap.parse_args(argv)
+
+
+async def serve(args):
+    cfg = load_config()
+    tracing.from_config(cfg)
+    opts = {**DEFAULTS, **(cfg.get("server") or {})}
+    app = InferenceServer(cfg, opts)
+
+    for slug in args.preload:
+        t0 = time.perf_counter()
+        await app._in_executor(app.residency.ensure_loaded, app.by_slug[slug])
+        print(f"[server] loaded {slug} in {time.perf_counter() - t0:.1f} s", file=sys.stderr)
+
+    if args.socket:
+        try:
+            if not stat.S_ISSOCK(os.lstat(args.socket).st_mode):
+                sys.exit(f"[server] {args.socket} exists and is not a socket; refusing to remove it")
+            os.remove(args.socket)  # left over from an earlier run
+        except FileNotFoundError:
+            pass
+        # Created 0600 (current user only) from the start; a chmod afterwards would leave a window
+        umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(app.handle, path=args.socket)
+        finally:
+            os.umask(umask)
+        where = args.socket
+    else:
+        host, port = args.host or opts["host"], args.port or opts["port"]
+        server = await asyncio.start_server(app.handle, host, port)
+        where = f"http://{host}:{port}"
+    print(f"[server] listening on {where}", file=sys.stderr)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C raises KeyboardInterrupt instead
+    async with server:
+        await stop.wait()
+    app.close()
+    if args.socket:
+        os.remove(args.socket)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+from app_model.result_cache import ResultCache
+from app_model.text_sentiment import TextSentimentAdapter
+
+
+def test_long_document_settings_change_the_key():
+    cache = ResultCache()
+    adapter = TextSentimentAdapter()
+    key = cache.key(adapter, "a long review")
+    cache.put(key, {"result": "POSITIVE (0.99)"})
+    assert cache.get(key) is not None
+
+    adapter.configure(long_documents=False)
+    assert cache.get(cache.key(adapter, "a long review")) is None
+    assert cache.misses == 1
+
+
+class _ImageAdapter:
+    model_name = "stub"
+    input_kind = "image"
+
+    def cache_params(self):
+        return {}
+
+    def run(self, payload, cancel=None):
+        return {"result": "cat", "image_path": payload["image_path"]}
+
+
+def test_image_hit_reports_the_requested_path(tmp_path):
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"same bytes")
+    second.write_bytes(b"same bytes")
+    cache, adapter = ResultCache(), _ImageAdapter()
+    cache.run(adapter, {"image_path": str(first)})
+    out = cache.run(adapter, {"image_path": str(second)})
+    assert out["_cached"] and out["image_path"] == str(second)
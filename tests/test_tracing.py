@@ -0,0 +1,12 @@
+from helpers.tracing import Histogram
+
+
+def test_quantiles_never_exceed_the_max():
+    hist = Histogram()
+    for ms in (3, 3, 7, 40, 1200):
+        hist.record(int(ms * 1e6))
+        for q in (0.0, 0.5, 0.9, 0.95, 0.99, 1.0):
+            assert hist.quantile(q) <= hist.max_ns / 1e6
+    single = Histogram()
+    single.record(3_000_000)
+    assert single.quantile(0.99) == 3.0
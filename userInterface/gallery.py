@@ -0,0 +1,195 @@
+# userInterface/gallery.py
+import os
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk
+
+from helpers.asset_store import get_store
+from helpers.theme import apply_theme
+
+
+class GalleryDialog(tk.Toplevel):
+    """Browse generated images by prompt. Only thumbnails are decoded, one page at a time."""
+
+    PAGE = 48
+    COLS = 4
+    CELL = 164
+
+    def __init__(self, master, on_open=None):
+        super().__init__(master)
+        self.title("Gallery")
+        self.geometry("760x580")
+        self.transient(master)
+        apply_theme(self)
+
+        self.store = get_store()
+        self.on_open = on_open
+        self._rows = []
+        self._photos = {}          # row id -> PhotoImage (keeps references alive)
+        self._cells = {}           # row id -> thumbnail Label
+        self._exhausted = False
+        self._search_job = None
+        self._generation = 0       # bumps on every new search so stale thumbnails are dropped
+
+        # Thumbnails are decoded on a worker; the UI thread only builds PhotoImages
+        self._requests = queue.Queue()
+        self._ready = queue.Queue()
+        threading.Thread(target=self._thumb_worker, daemon=True).start()
+        self._reindexing = None    # [added so far, finished] while a reindex runs
+        self.bind("<Destroy>", self._on_destroy)
+
+        # Search bar
+        bar = ttk.Frame(self, padding=(10, 8))
+        bar.pack(fill="x")
+        self.var_query = tk.StringVar()
+        entry = ttk.Entry(bar, textvariable=self.var_query)
+        entry.pack(side="left", fill="x", expand=True)
+        entry.bind("<KeyRelease>", lambda e: self._schedule_search())
+        self.btn_reindex = ttk.Button(bar, text="Reindex", command=self._reindex)
+        self.btn_reindex.pack(side="left", padx=(6, 0))
+        self.lbl_count = ttk.Label(bar, text="")
+        self.lbl_count.pack(side="left", padx=(10, 0))
+
+        # Scrollable grid
+        body = ttk.Frame(self)
+        body.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.canvas = tk.Canvas(body, highlightthickness=0, bd=0)
+        vsb = ttk.Scrollbar(body, orient="vertical", command=self._on_scroll)
+        self.canvas.configure(yscrollcommand=vsb.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        vsb.pack(side="right", fill="y")
+        self.grid_frame = ttk.Frame(self.canvas)
+        self.canvas.create_window((0, 0), window=self.grid_frame, anchor="nw")
+        self.grid_frame.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda e: self._on_scroll("scroll", -1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self._on_scroll("scroll", 1, "units"))
+
+        self._search()
+        self.after(50, self._pump)
+
+    # ---------------- Searching / paging ---------------- #
+    def _schedule_search(self):
+        # Debounce typing so each keystroke doesn't hit the index
+        if self._search_job:
+            self.after_cancel(self._search_job)
+        self._search_job = self.after(250, self._search)
+
+    def _search(self):
+        self._search_job = None
+        self._generation += 1
+        for child in self.grid_frame.winfo_children():
+            child.destroy()
+        self._rows, self._photos, self._cells = [], {}, {}
+        self._exhausted = False
+        self.canvas.yview_moveto(0)
+        self._load_page()
+        self.lbl_count.configure(text=f"{self.store.count()} images indexed")
+
+    def _load_page(self):
+        if self._exhausted:
+            return
+        rows = self.store.search(self.var_query.get(), self.PAGE, len(self._rows))
+        if len(rows) < self.PAGE:
+            self._exhausted = True
+        for row in rows:
+            self._add_cell(len(self._rows), row)
+            self._rows.append(row)
+            self._requests.put((self._generation, row))
+
+    def _add_cell(self, index, row):
+        cell = ttk.Frame(self.grid_frame, padding=4)
+        cell.grid(row=index // self.COLS, column=index % self.COLS, sticky="n")
+        thumb = tk.Label(cell, width=self.CELL // 8, height=self.CELL // 16, text="…", bd=0)
+        thumb.pack()
+        caption = (row.get("prompt") or os.path.basename(row["path"]))[:28]
+        ttk.Label(cell, text=caption, wraplength=self.CELL).pack()
+        for widget in (cell, thumb):
+            widget.bind("<Button-1>", lambda e, r=row: self._open(r))
+            widget.bind("<MouseWheel>", self._on_wheel)
+        self._cells[row["id"]] = thumb
+
+    def _on_scroll(self, *args):
+        self.canvas.yview(*args)
+        # Next page once the user nears the bottom
+        if self.canvas.yview()[1] > 0.9:
+            self._load_page()
+
+    def _on_wheel(self, event):
+        self._on_scroll("scroll", -1 if event.delta > 0 else 1, "units")
+
+    def _reindex(self):
+        # The scan runs on a worker; _poll_reindex shows its progress
+        if self._reindexing:
+            return
+        state = self._reindexing = [0, False]
+
+        def work():
+            try:
+                state[0] = self.store.reindex(progress=lambda added: state.__setitem__(0, added))
+            finally:
+                state[1] = True
+
+        self.btn_reindex.configure(state="disabled")
+        threading.Thread(target=work, daemon=True).start()
+        self.after(200, self._poll_reindex)
+
+    def _poll_reindex(self):
+        if not self.winfo_exists():
+            return
+        added, finished = self._reindexing
+        if not finished:
+            self.lbl_count.configure(text=f"Reindexing... {added} added")
+            self.after(200, self._poll_reindex)
+            return
+        self._reindexing = None
+        self.btn_reindex.configure(state="normal")
+        self._search()
+        self.lbl_count.configure(text=f"Added {added}, {self.store.count()} images indexed")
+
+    def _open(self, row):
+        if self.on_open:
+            self.on_open(row)
+
+    # ---------------- Thumbnails ---------------- #
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self._requests.put(None)  # stops the thumbnail worker
+
+    def _thumb_worker(self):
+        from PIL import Image  # heavy; imported on first use only
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            generation, row = item
+            if generation != self._generation:
+                continue
+            try:
+                thumb = self.store.ensure_thumb(row)
+                img = Image.open(thumb)
+                img.load()
+            except Exception:
+                img = None
+            self._ready.put((generation, row["id"], img))
+
+    def _pump(self):
+        from PIL import ImageTk  # heavy; imported on first use only
+        if not self.winfo_exists():
+            return
+        for _ in range(16):  # bounded work per tick keeps scrolling smooth
+            try:
+                generation, row_id, img = self._ready.get_nowait()
+            except queue.Empty:
+                break
+            label = self._cells.get(row_id)
+            if generation != self._generation or label is None:
+                continue
+            if img is None:
+                label.configure(text="(missing)")
+                continue
+            photo = ImageTk.PhotoImage(img)
+            self._photos[row_id] = photo
+            label.configure(image=photo, text="", width=0, height=0)
+        self.after(50, self._pump)
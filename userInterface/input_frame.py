@@ -19,14 +19,24 @@ class InputFrame(ttk.LabelFrame):
         # Path + Browse
         self.ent_path = ttk.Entry(self, textvariable=self.var_path)
         self.ent_path.grid(row=1, column=0, columnspan=2, sticky="ew", padx=6, pady=(0,6))
-        ttk.Button(self, text="Browse", command=self._browse).grid(row=1, column=2, sticky="e", padx=(0,6), pady=(0,6))
+        buttons = ttk.Frame(self)
+        buttons.grid(row=1, column=2, sticky="e", padx=(0,6), pady=(0,6))
+        ttk.Button(buttons, text="Browse", command=self._browse).pack(side="left")
+        ttk.Button(buttons, text="Folder", command=self._browse_folder).pack(side="left", padx=(4,0))
 
         # Text box
         self.txt = ScrolledText(self, height=8, wrap="word")
         self.txt.grid(row=3, column=0, columnspan=3, sticky="nsew", padx=6, pady=(0,6))
 
     def _browse(self):
-        path = filedialog.askopenfilename(filetypes=[("Images","*.png;*.jpg;*.jpeg;*.bmp;*.gif"), ("All files","*.*")])
+        path = filedialog.askopenfilename(filetypes=[("Images","*.png;*.jpg;*.jpeg;*.bmp;*.gif;*.webp"), ("All files","*.*")])
+        if path:
+            self.var_mode.set("image")
+            self.var_path.set(path)
+
+    def _browse_folder(self):
+        # Image adapters run every image in the folder as a batch
+        path = filedialog.askdirectory()
         if path:
             self.var_mode.set("image")
             self.var_path.set(path)
@@ -1,10 +1,45 @@
 import os, shutil, platform, subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import tkinter as tk
 from tkinter import ttk, filedialog
-from PIL import Image, ImageTk
-import imageio.v3 as iio
 
+from helpers.images import load_image
+from helpers import image_writer
 from userInterface._parts import ThemedScrolledText
+from userInterface.video_player import VideoPlayer
+
+# One shared worker: resampling is CPU-bound and only the latest request matters
+_render_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+
+
+def _display_size(src, box, min_dim=220, max_dim=720):
+    """Final preview size: normalised to stay within 220–720 px, then fitted into `box`."""
+    w, h = src
+    scale_down = min(max_dim / w, max_dim / h, 1.0)
+    scale_up = max(min_dim / w, min_dim / h, 1.0)
+    scale = scale_up if scale_up > 1.0 else scale_down
+
+    new_w = max(1, min(int(w * scale), max_dim))
+    new_h = max(1, min(int(h * scale), max_dim))
+
+    fit = min(box[0] / new_w, box[1] / new_h, 1.0)  # like thumbnail(): shrink only
+    return max(1, int(new_w * fit)), max(1, int(new_h * fit))
+
+
+def _resample(img, size):
+    if img.size == size:
+        return img
+    from PIL import Image  # heavy; imported on first render only
+    return img.resize(size, resample=Image.LANCZOS, reducing_gap=2.0)
+
+
+def _decode_preview(path, box):
+    """(image, display size, resampled image) for a file; runs on _render_pool."""
+    img = load_image(path, (720, 720))  # shared with the image adapters
+    size = _display_size(img.size, box)
+    return img, size, _resample(img, size)
+
 
 class OutputFrame(ttk.LabelFrame):
     """Widget to display model output text and preview of images/videos."""
@@ -42,99 +77,193 @@ class OutputFrame(ttk.LabelFrame):
         # Internal state
         self._last_path = None
         self._last_image = None
+        self._raw_img = None
+        self._raw_version = 0          # bumps whenever the source image changes
+        self._scaled = OrderedDict()   # display size -> PhotoImage, for the current source
+        self._refresh_job = None
+        self._pending = None           # (version, size) being resampled right now
+        self._player = None            # VideoPlayer while a video preview is playing
 
-        # Refresh preview automatically when widget resizes
-        self.preview.bind("<Configure>", lambda e: self._refresh_preview())
+        # Refresh preview (debounced) when widget resizes
+        self.preview.bind("<Configure>", lambda e: self._schedule_refresh())
 
     # Show results in text + preview area
     def show(self, payload):
         """Accepts a string, or dict with 'result' plus optional 'image_path'/'video_path'."""
         self.txt.delete("1.0", "end")
 
+        image = None
         if isinstance(payload, dict):
             self.txt.insert("1.0", str(payload.get("result", "")))
             path = payload.get("image_path") or payload.get("video_path") or payload.get("still_path")
+            image = payload.get("image")  # in-memory result; its file may still be writing
         else:
             self.txt.insert("1.0", str(payload))
             path = None
 
         self._last_path = path
-        self._render_preview(path)
+        self._stop_video()
+        if image is not None:
+            self.show_preview(image)
+            self.btn_open.configure(state="normal")
+            self.btn_save.configure(state="normal")
+        else:
+            self._render_preview(path)
+
+    # Show an in-memory image (e.g. a live generation preview) without touching the text/buttons
+    def show_preview(self, img):
+        self._stop_video()
+        self._set_raw_image(img)
+        self._refresh_preview()
 
     # Clear all output
     def clear(self):
+        self._stop_video()
         self.txt.delete("1.0", "end")
         self.preview.configure(image="", text="")
         self.btn_open.configure(state="disabled")
         self.btn_save.configure(state="disabled")
         self._last_path = None
         self._last_image = None
+        self._set_raw_image(None)
 
     # Render an image or video still if a path is available
     def _render_preview(self, path):
         if not path or not os.path.exists(path):
+            self._set_raw_image(None)
             self.preview.configure(image="", text="")
             self.btn_open.configure(state="disabled")
             self.btn_save.configure(state="disabled")
             return
 
-        img = None
+        self.btn_open.configure(state="normal")
+        self.btn_save.configure(state="normal")
+        # Handle video files (stream playback, frames arrive from the player)
+        if path.lower().endswith((".mp4", ".mov", ".webm", ".avi", ".mkv")):
+            self._play_video(path)
+            return
+        # Handle image files: decode and resample off the Tk thread; the old preview stays until then
+        self._set_raw_image(None)
+        if path.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")):
+            future = _render_pool.submit(_decode_preview, path, self._preview_box())
+            self._poll_decode(future, self._raw_version, path)
+            return
+        self._show_filename(path)
+
+    def _poll_decode(self, future, version, path):
+        if not future.done():
+            self.after(15, self._poll_decode, future, version, path)
+            return
+        if version != self._raw_version:
+            return  # another output replaced this one while it was decoding
         try:
-            # Handle image files
-            if path.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".gif")):
-                img = Image.open(path).convert("RGB")
-            # Handle video files (show first frame)
-            elif path.lower().endswith((".mp4", ".mov", ".webm", ".avi", ".mkv")):
-                frame = iio.imread(path, index=0)
-                img = Image.fromarray(frame)
+            img, size, scaled = future.result()
         except Exception:
-            img = None
-
-        # If not an image or failed to load, just show filename
-        if img is None:
-            self.preview.configure(image="", text=os.path.basename(path))
-            self.btn_open.configure(state="normal")
-            self.btn_save.configure(state="normal")
+            # If not an image or failed to load, just show filename
+            self._show_filename(path)
             return
+        self._set_raw_image(img)
+        self._cache_photo(size, scaled)
+        self._refresh_preview()  # a cache hit unless the pane was resized meanwhile
 
-        # Resize to stay within 220–720 px
-        try:
-            min_dim, max_dim = 220, 720
-            w, h = img.size
+    def _show_filename(self, path):
+        self.preview.configure(image="", text=os.path.basename(path))
 
-            scale_down = min(max_dim / w, max_dim / h, 1.0)
-            scale_up = max(min_dim / w, min_dim / h, 1.0)
+    def _set_raw_image(self, img):
+        self._raw_img = img
+        self._raw_version += 1
+        self._scaled.clear()
 
-            if scale_up > 1.0:
-                new_w, new_h = int(w * scale_up), int(h * scale_up)
-            else:
-                new_w, new_h = int(w * scale_down), int(h * scale_down)
+    # ---------------- Video ---------------- #
+    def _play_video(self, path):
+        self._set_raw_image(None)
+        self.preview.configure(image="", text="Loading video…")
+        self._player = VideoPlayer(self, path, self._show_video_frame, _display_size, self._preview_box(),
+                                   on_error=self._video_failed)
+        self._player.start()
 
-            new_w = max(1, min(new_w, max_dim))
-            new_h = max(1, min(new_h, max_dim))
+    def _show_video_frame(self, img):
+        # Frames come pre-scaled from the decode thread; just hand them to Tk
+        from PIL import ImageTk
+        self._last_image = ImageTk.PhotoImage(img)
+        self.preview.configure(image=self._last_image, text="")
 
-            self._raw_img = img.resize((new_w, new_h), resample=Image.LANCZOS)
-        except Exception:
-            self._raw_img = img
+    def _video_failed(self, message):
+        self._player = None
+        self._last_image = None
+        self.preview.configure(image="", text=f"Could not play video:\n{message}")
 
-        self._refresh_preview()
-        self.btn_open.configure(state="normal")
-        self.btn_save.configure(state="normal")
+    def _stop_video(self):
+        if self._player is not None:
+            self._player.stop()
+            self._player = None
 
-    # Update preview when window is resized
+    def _preview_box(self):
+        return (max(self.preview.winfo_width(), 1), max(self.preview.winfo_height(), 1))
+
+    # Coalesce bursts of <Configure> events (pane drags) into one render
+    def _schedule_refresh(self, delay=60):
+        if self._refresh_job:
+            self.after_cancel(self._refresh_job)
+        self._refresh_job = self.after(delay, self._refresh_preview)
+
+    # Update preview for the current widget size; resampling runs off the Tk thread
     def _refresh_preview(self):
-        if not hasattr(self, "_raw_img"): 
+        self._refresh_job = None
+        if self._player is not None:
+            self._player.box = self._preview_box()  # next decoded frames use the new size
             return
-        w = max(self.preview.winfo_width(), 1)
-        h = max(self.preview.winfo_height(), 1)
-        img = self._raw_img.copy()
-        img.thumbnail((w, h))
-        self._last_image = ImageTk.PhotoImage(img)
-        self.preview.configure(image=self._last_image)
+        img = self._raw_img
+        if img is None:
+            return
+        box = self._preview_box()
+        size = _display_size(img.size, box)
+
+        photo = self._scaled.get(size)
+        if photo is not None:
+            self._scaled.move_to_end(size)
+            self._show_photo(photo)
+            return
+        if self._pending == (self._raw_version, size):
+            return
+
+        self._pending = (self._raw_version, size)
+        future = _render_pool.submit(_resample, img, size)
+        self._poll_render(future, self._raw_version, size)
+
+    def _poll_render(self, future, version, size):
+        if not future.done():
+            self.after(15, self._poll_render, future, version, size)
+            return
+        if self._pending == (version, size):
+            self._pending = None
+        if version != self._raw_version:
+            return  # the source changed while this was rendering
+        try:
+            scaled = future.result()
+        except Exception:
+            return
+        self._show_photo(self._cache_photo(size, scaled))
+
+    def _cache_photo(self, size, scaled):
+        # PhotoImage must be built on the Tk thread
+        from PIL import ImageTk  # heavy; imported on first render only
+        photo = ImageTk.PhotoImage(scaled)
+        self._scaled[size] = photo
+        while len(self._scaled) > 6:
+            self._scaled.popitem(last=False)
+        return photo
+
+    def _show_photo(self, photo):
+        self._last_image = photo
+        self.preview.configure(image=photo, text="")
 
     # Open file in system viewer
     def _open(self):
-        if not self._last_path or not os.path.exists(self._last_path): 
+        if not self._last_path:
+            return
+        image_writer.wait(self._last_path)
+        if not os.path.exists(self._last_path):
             return
         system = platform.system()
         try:
@@ -149,7 +278,10 @@ class OutputFrame(ttk.LabelFrame):
 
     # Save a copy of the file to a chosen location
     def _save_as(self):
-        if not self._last_path or not os.path.exists(self._last_path): 
+        if not self._last_path:
+            return
+        image_writer.wait(self._last_path)
+        if not os.path.exists(self._last_path):
             return
         base = os.path.basename(self._last_path)
         ext = os.path.splitext(base)[1].lower()
@@ -1,7 +1,7 @@
 # preferences.py
 import tkinter as tk
 from tkinter import ttk, colorchooser
-from helpers.config import load_config, save_config
+from helpers.config import load_config, update_config
 from helpers.theme import apply_theme
 
 class PreferencesDialog(tk.Toplevel):
@@ -82,12 +82,15 @@ class PreferencesDialog(tk.Toplevel):
             var.set(color)
 
     def _apply(self):
-        cfg = load_config()
-        cfg["theme"] = self.var_theme.get()
-        if cfg["theme"] == "Custom":
-            cfg["custom"].update({k: v.get() for k, v in self.vars.items()})
-            cfg["custom"]["font_size"] = int(self.var_font.get())
-        save_config(cfg)
+        theme = self.var_theme.get()
+        custom = {k: v.get() for k, v in self.vars.items()}
+        custom["font_size"] = int(self.var_font.get())
+
+        def edit(cfg):
+            cfg["theme"] = theme
+            if theme == "Custom":
+                cfg["custom"].update(custom)
+        update_config(edit)
 
         apply_theme(self.master)
         self.destroy()
@@ -0,0 +1,127 @@
+# userInterface/video_player.py
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class VideoPlayer:
+    """Streams a video into a preview widget with constant memory.
+
+    A decode thread walks the file with imageio's frame iterator, scales each frame
+    to the current display box and pushes it into a small bounded buffer. The Tk
+    side pulls frames on a timer and skips any that are already late, so a slow UI
+    drops frames instead of falling behind or letting the buffer grow.
+    """
+
+    def __init__(self, widget, path, show_frame, fit_size, box, buffer_frames=8, loop=True, on_error=None):
+        self.widget = widget          # any Tk widget, used for after()
+        self.path = path
+        self.show_frame = show_frame  # called on the Tk thread with a PIL image
+        self.fit_size = fit_size      # (frame size, box) -> display size
+        self.box = box                # updated by the owner when the preview resizes
+        self.loop = loop
+        self.on_error = on_error      # called on the Tk thread with a message if decoding fails
+
+        self._frames = queue.Queue(maxsize=buffer_frames)
+        self._stop = threading.Event()
+        self._fps = 25.0
+        self._t0 = None               # wall-clock time of frame 0 in the current pass
+        self._job = None
+        self._held = None
+        self.dropped = 0
+
+    def start(self):
+        threading.Thread(target=self._decode, daemon=True).start()
+        self._job = self.widget.after(10, self._tick)
+
+    def stop(self):
+        self._stop.set()
+        if self._job:
+            try:
+                self.widget.after_cancel(self._job)
+            except Exception:
+                pass
+            self._job = None
+        # Unblock the decoder if it is waiting on a full buffer
+        try:
+            while True:
+                self._frames.get_nowait()
+        except queue.Empty:
+            pass
+
+    # ---------------- Decode thread ---------------- #
+    def _decode(self):
+        import imageio.v3 as iio
+        from PIL import Image
+
+        try:
+            self._fps = float(iio.immeta(self.path).get("fps") or 25.0)
+        except Exception:
+            pass
+        while not self._stop.is_set():
+            try:
+                for index, frame in enumerate(iio.imiter(self.path)):
+                    if self._stop.is_set():
+                        return
+                    img = Image.fromarray(frame)
+                    size = self.fit_size(img.size, self.box)
+                    if img.size != size:
+                        img = img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+                    self._put((index, img))
+            except Exception as ex:
+                self._put((None, str(ex) or type(ex).__name__))  # unreadable: let the UI know and stop
+                return
+            self._put(_END)
+            if not self.loop:
+                return
+
+    def _put(self, item):
+        # Blocking put keeps memory bounded; wake up regularly to notice stop()
+        while not self._stop.is_set():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    # ---------------- Tk side ---------------- #
+    def _next(self):
+        # Frame taken from the buffer but not shown yet (it wasn't due)
+        if self._held is not None:
+            item, self._held = self._held, None
+            return item
+        return self._frames.get_nowait()
+
+    def _tick(self):
+        self._job = None
+        if self._stop.is_set():
+            return
+        now = time.perf_counter()
+        due = None
+        while True:
+            try:
+                item = self._next()
+            except queue.Empty:
+                break
+            if item is _END:
+                self._t0 = None  # next pass starts its own clock
+                continue
+            index, img = item
+            if index is None:
+                self.stop()  # decode failed; img is the error message
+                if self.on_error:
+                    self.on_error(img)
+                return
+            if self._t0 is None:
+                self._t0 = now - index / self._fps
+            if self._t0 + index / self._fps > now:
+                self._held = item  # not due yet
+                break
+            if due is not None:
+                self.dropped += 1  # a newer frame is also due: skip the older one
+            due = img
+        if due is not None:
+            self.show_frame(due)
+        self._job = self.widget.after(max(5, int(500 / self._fps)), self._tick)